@@ -1,12 +1,32 @@
 #!/usr/bin/env python3
 
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 import argparse
-from matplotlib.widgets import Slider, Button, TextBox
+import mmap
+import os
+import re
 import math
+import functools
+import string
+
+# The reflection reader, filter and large-set limits live in hkl_io.py,
+# which hkl_reflections.py shares
+from hkl_io import (REFLECTION_HEADER, REFLECTION_DTYPE, ROTATION_POINT_LIMIT,
+                    RASTER_REFLECTION_THRESHOLD, read_hkl_reflections, reflection_mask)
+
+# scipy is optional; without it bond candidates and the closest atom pair
+# come from full distance matrices
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# numba is optional; without it the closest atom pair search uses NumPy
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 # Comprehensive atomic radius data (in Angstroms)
 # Data compiled from various sources including:
@@ -82,27 +102,69 @@ ELEMENT_COLORS = {
     'Md': '#B30DA6', 'No': '#BD0D87', 'Lr': '#C70066'
 }
 
-def get_atomic_radius(element_symbol):
+# Radius and color lookup tables indexed by integer element index
+# The final slot holds the defaults used for unknown elements
+ELEMENT_SYMBOLS = sorted(set(ATOMIC_RADII) | set(ELEMENT_COLORS))
+ELEMENT_INDEX = {symbol: i for i, symbol in enumerate(ELEMENT_SYMBOLS)}
+UNKNOWN_ELEMENT = len(ELEMENT_SYMBOLS)
+RADIUS_TABLE = np.array([ATOMIC_RADII.get(symbol, 1.0) for symbol in ELEMENT_SYMBOLS] + [1.0])
+COLOR_TABLE = np.array([ELEMENT_COLORS.get(symbol, '#808080') for symbol in ELEMENT_SYMBOLS] + ['#808080'])
+
+# Lines of interest in the HKL file header
+CELL_LINE = re.compile(r'^[ \t]*# CELL((?:[ \t]+\S+){6})', re.MULTILINE)
+ATOM_HEADER = 'X         Y         Z         B         Occ       Spin      Charge'
+ATOM_LINE = re.compile(r'^[ \t]*# Atom(?:[ \t]+\S+){8}', re.MULTILINE)
+
+# Record layout returned by the atom reader
+ATOM_DTYPE = np.dtype([('name', 'U16'), ('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+                       ('B', 'f8'), ('occ', 'f8'), ('spin', 'f8'), ('charge', 'f8')])
+
+# Above this many atoms, atoms are drawn as depth-shaded markers instead of meshes
+SCATTER_ATOM_THRESHOLD = 200
+# Approximate number of sphere triangles drawn in mesh mode
+SPHERE_TRIANGLE_BUDGET = 100000
+# Above this many reflections, only the strongest are drawn as sized, colored markers
+BULK_REFLECTION_THRESHOLD = 20000
+STRONG_REFLECTION_COUNT = 2000
+# Most weak reflections drawn inside the current view limits
+BULK_POINT_LIMIT = 20000
+
+@functools.lru_cache(maxsize=None)
+def _element_index(element):
     """
-    Extract element symbol and return its atomic radius.
+    Return the lookup table index for an element symbol such as 'Si'.
     """
-    # Extract element symbol (first letter + second letter if lowercase)
-    element = ''.join(filter(str.isalpha, element_symbol))
-    if element in ATOMIC_RADII:
-        return ATOMIC_RADII[element]
-    else:
+    if element not in ATOMIC_RADII:
         print(f"Warning: Unknown element '{element}', using default radius 1.0 Å")
-        return 1.0
+    return ELEMENT_INDEX.get(element, UNKNOWN_ELEMENT)
+
+# Translation table removing the digits, signs and punctuation of atom labels
+_LABEL_NON_ALPHA = str.maketrans('', '', string.digits + string.punctuation + string.whitespace)
 
-def get_element_color(element_symbol):
+def element_symbols(atoms):
     """
-    Extract element symbol and return its color.
+    Return a string array with the element symbol of every atom, e.g. 'Si' for 'Si1'.
     """
-    element = ''.join(filter(str.isalpha, element_symbol))
-    if element in ELEMENT_COLORS:
-        return ELEMENT_COLORS[element]
-    else:
-        return '#808080'  # Default gray color
+    return np.char.translate(atoms['name'], _LABEL_NON_ALPHA)
+
+def element_indices(atoms):
+    """
+    Return an integer array of lookup table indices, one per atom.
+    """
+    # Look up each distinct element once and scatter the result back to the atoms
+    symbols, inverse = np.unique(element_symbols(atoms), return_inverse=True)
+    lookup = np.array([_element_index(symbol) for symbol in symbols], dtype=np.intp)
+    return lookup[inverse.ravel()]
+
+def group_atoms_by_element(atoms):
+    """
+    Group atoms by element symbol.
+    Returns a dictionary mapping each element, in order of first appearance,
+    to an integer array of the indices of its atoms.
+    """
+    symbols = element_symbols(atoms)
+    unique, first = np.unique(symbols, return_index=True)
+    return {str(element): np.flatnonzero(symbols == element) for element in unique[np.argsort(first)]}
 
 def convert_fractional_to_real(fractional_coords, lattice_params):
     """
@@ -145,45 +207,152 @@ def convert_fractional_to_real(fractional_coords, lattice_params):
     
     return (x_real, y_real, z_real)
 
+@functools.lru_cache(maxsize=8)
+def _unit_sphere(resolution):
+    """
+    Create a triangulated unit sphere centred on the origin.
+    
+    The mesh is cached per resolution and shared between callers, so the
+    returned arrays are read-only. Vertices are single precision since they
+    only feed the display.
+    """
+    # Generate spherical coordinates, theta along rows and phi along columns
+    phi = np.linspace(0, 2 * np.pi, resolution, dtype=np.float32)[None, :]
+    theta = np.linspace(0, np.pi, resolution, dtype=np.float32)[:, None]
+    sin_theta = np.sin(theta)
+    
+    # Convert to Cartesian coordinates by broadcasting the 1D angle vectors
+    # straight into the vertex array
+    vertices = np.empty((resolution, resolution, 3), dtype=np.float32)
+    vertices[..., 0] = sin_theta * np.cos(phi)
+    vertices[..., 1] = sin_theta * np.sin(phi)
+    vertices[..., 2] = np.cos(theta)
+    vertices = vertices.reshape(-1, 3)
+    
+    # Calculate vertex indices for every grid cell at once
+    i, j = np.mgrid[:resolution - 1, :resolution - 1]
+    idx1 = (i * resolution + j).ravel()
+    idx2 = idx1 + 1
+    idx3 = idx1 + resolution
+    idx4 = idx3 + 1
+    
+    # Create triangular faces, two triangles for each grid cell
+    faces = np.empty((2 * idx1.size, 3), dtype=np.int32)
+    faces[0::2] = np.stack([idx1, idx2, idx3], axis=1)
+    faces[1::2] = np.stack([idx2, idx4, idx3], axis=1)
+    
+    vertices.setflags(write=False)
+    faces.setflags(write=False)
+    return vertices, faces
+
+def sphere_resolution(n_atoms, max_resolution=25):
+    """
+    Choose a sphere mesh resolution that keeps the total triangle count of
+    n_atoms spheres near SPHERE_TRIANGLE_BUDGET.
+    """
+    # A sphere of resolution r has 2 * (r - 1)**2 triangles
+    resolution = int(math.sqrt(SPHERE_TRIANGLE_BUDGET / (2 * max(n_atoms, 1)))) + 1
+    return max(6, min(max_resolution, resolution))
+
+def atoms_to_real(atoms, lattice_params):
+    """
+    Convert the fractional coordinates of all atoms to an (N, 3) array of
+    real space coordinates in Angstroms.
+    """
+    return np.column_stack(convert_fractional_to_real((atoms['x'], atoms['y'], atoms['z']), lattice_params))
+
 def create_sphere(center, radius, resolution=20):
     """
     Create a 3D sphere using triangulation.
     """
-    # Generate spherical coordinates
-    phi = np.linspace(0, 2 * np.pi, resolution)
-    theta = np.linspace(0, np.pi, resolution)
-    
-    # Create meshgrid
-    phi_grid, theta_grid = np.meshgrid(phi, theta)
-    
-    # Convert to Cartesian coordinates
-    x = center[0] + radius * np.sin(theta_grid) * np.cos(phi_grid)
-    y = center[1] + radius * np.sin(theta_grid) * np.sin(phi_grid)
-    z = center[2] + radius * np.cos(theta_grid)
-    
-    # Flatten arrays
-    x_flat = x.flatten()
-    y_flat = y.flatten()
-    z_flat = z.flatten()
-    
-    # Create vertices array
-    vertices = np.column_stack((x_flat, y_flat, z_flat))
-    
-    # Create triangular faces
-    faces = []
-    for i in range(resolution - 1):
-        for j in range(resolution - 1):
-            # Calculate indices for current grid cell
-            idx1 = i * resolution + j
-            idx2 = i * resolution + (j + 1)
-            idx3 = (i + 1) * resolution + j
-            idx4 = (i + 1) * resolution + (j + 1)
-            
-            # Add two triangles for each grid cell
-            faces.append([idx1, idx2, idx3])
-            faces.append([idx2, idx4, idx3])
+    unit_vertices, faces = _unit_sphere(resolution)
+    return np.asarray(center, dtype=np.float32) + np.float32(radius) * unit_vertices, faces
+
+def find_bond_candidates(coords, bond_cutoff):
+    """
+    Find all atom pairs closer than the bond cutoff distance.
     
-    return vertices, faces
+    Parameters:
+    - coords: (N, 3) array of real space coordinates in Angstroms
+    - bond_cutoff: Maximum pair distance in Angstroms
+    
+    Returns:
+    - pairs: (M, 2) integer array of atom index pairs with i < j
+    """
+    if len(coords) < 2:
+        return np.empty((0, 2), dtype=int)
+    
+    if cKDTree is not None:
+        # Spatial index only visits neighbouring atoms
+        return cKDTree(coords).query_pairs(r=bond_cutoff, output_type='ndarray')
+    
+    # Fallback: upper triangle of the full pairwise distance matrix
+    diff = coords[:, None, :] - coords[None, :, :]
+    distances = np.sqrt(np.sum(diff * diff, axis=-1))
+    return np.argwhere(np.triu(distances <= bond_cutoff, k=1))
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True)
+    def _min_pair_distance_sq(coords):
+        """
+        Return the smallest squared distance between any two rows of coords.
+        """
+        n = coords.shape[0]
+        row_min = np.full(n, np.inf)
+        for i in prange(n):
+            local_min = np.inf
+            for j in range(i + 1, n):
+                dx = coords[i, 0] - coords[j, 0]
+                dy = coords[i, 1] - coords[j, 1]
+                dz = coords[i, 2] - coords[j, 2]
+                d2 = dx*dx + dy*dy + dz*dz
+                if d2 < local_min:
+                    local_min = d2
+            row_min[i] = local_min
+        return row_min.min()
+else:
+    def _min_pair_distance_sq(coords):
+        """
+        Return the smallest squared distance between any two rows of coords.
+        """
+        diff = coords[:, None, :] - coords[None, :, :]
+        dist_sq = np.sum(diff * diff, axis=-1)
+        np.fill_diagonal(dist_sq, np.inf)
+        return dist_sq.min()
+
+def min_pair_distance(coords):
+    """
+    Return the minimum distance between any two of the (N, 3) coordinates.
+    """
+    coords = np.ascontiguousarray(coords, dtype=np.float64)
+    if cKDTree is not None:
+        # Nearest neighbour of every atom, the first match is the atom itself
+        distances, _ = cKDTree(coords).query(coords, k=2)
+        return float(distances[:, 1].min())
+    return math.sqrt(_min_pair_distance_sq(coords))
+
+def bin_reflections(hkl_data, bin_size):
+    """
+    Aggregate reflections onto a coarser grid by summing |Fc|² over blocks of bin_size³ HKL points.
+    
+    Parameters:
+    - hkl_data: Reflection records (REFLECTION_DTYPE)
+    - bin_size: Edge length of the blocks in reciprocal lattice units
+    
+    Returns:
+    - Reflection records with one entry per occupied block, placed at the block centre
+    """
+    if bin_size <= 1 or len(hkl_data) == 0:
+        return hkl_data
+    
+    blocks = np.stack([hkl_data['h'], hkl_data['k'], hkl_data['l']], axis=1) // bin_size
+    blocks, block_index = np.unique(blocks, axis=0, return_inverse=True)
+    
+    binned = np.empty(len(blocks), dtype=REFLECTION_DTYPE)
+    centres = blocks * bin_size + bin_size // 2
+    binned['h'], binned['k'], binned['l'] = centres.T
+    binned['fc2'] = np.bincount(block_index.reshape(-1), weights=hkl_data['fc2'], minlength=len(blocks))
+    return binned
 
 def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
     """
@@ -192,27 +361,15 @@ def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
     if len(atoms) < 2:
         return 1.0, {}
     
+    # Convert every atom to real space once, as an (N, 3) array
+    coords = atoms_to_real(atoms, lattice_params)
+    
     # Find minimum interatomic distance in real space
-    min_distance = float('inf')
-    for i, atom1 in enumerate(atoms):
-        for j, atom2 in enumerate(atoms[i+1:], i+1):
-            # Convert fractional coordinates to real space
-            real1 = convert_fractional_to_real((atom1['x'], atom1['y'], atom1['z']), lattice_params)
-            real2 = convert_fractional_to_real((atom2['x'], atom2['y'], atom2['z']), lattice_params)
-            
-            # Calculate real space distance
-            dx = real1[0] - real2[0]
-            dy = real1[1] - real2[1]
-            dz = real1[2] - real2[2]
-            distance = math.sqrt(dx*dx + dy*dy + dz*dz)
-            min_distance = min(min_distance, distance)
+    min_distance = min_pair_distance(coords)
     
     # Calculate maximum radius sum
-    max_radius_sum = 0
-    for atom in atoms:
-        radius = get_atomic_radius(atom['name'])
-        max_radius_sum = max(max_radius_sum, radius)
-    max_radius_sum *= 2  # For two atoms
+    radii = RADIUS_TABLE[element_indices(atoms)]
+    max_radius_sum = 2 * radii.max()  # For two atoms
     
     # Calculate optimal scale based on target overlap
     if max_radius_sum > 0:
@@ -235,6 +392,12 @@ def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
     scaled_radius_sum = max_radius_sum * optimal_scale
     overlap_with_optimal = max(0, (scaled_radius_sum - min_distance) / scaled_radius_sum) if scaled_radius_sum > 0 else 0
     
+    # Count atom pairs whose scaled spheres still overlap, only pairs closer than
+    # the largest scaled radius sum can qualify
+    pairs = find_bond_candidates(coords, scaled_radius_sum)
+    pair_distances = np.linalg.norm(coords[pairs[:, 0]] - coords[pairs[:, 1]], axis=1)
+    overlapping_pairs = int(np.count_nonzero(pair_distances < optimal_scale * radii[pairs].sum(axis=1)))
+    
     overlap_analysis = {
         'min_distance': min_distance,
         'max_radius_sum': max_radius_sum,
@@ -242,6 +405,7 @@ def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
         'optimal_scale': optimal_scale,
         'overlap_with_optimal': overlap_with_optimal,
         'scaled_radius_sum': scaled_radius_sum,
+        'overlapping_pairs': overlapping_pairs,
         'target_overlap': target_overlap
     }
     
@@ -251,95 +415,52 @@ def read_crystal_structure(filename):
     """
     Read crystal structure data from HKL file.
     Returns a tuple of (atoms, lattice_params) where:
-    - atoms: list of dictionaries containing atom information
+    - atoms: structured array of ATOM_DTYPE records, one per atom
     - lattice_params: dictionary with a, b, c, alpha, beta, gamma
     """
-    atoms = []
+    with open(filename, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            text = ''
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # The CELL and atom lines precede the reflection table, so only
+                # the header part of the file is read and decoded
+                table_start = mm.find(REFLECTION_HEADER)
+                text = mm[:table_start if table_start >= 0 else len(mm)].decode()
+    
+    # Parse lattice parameters from CELL line
     lattice_params = {}
-    reading_atoms = False
+    cell_match = CELL_LINE.search(text)
+    if cell_match:
+        a, b, c, alpha, beta, gamma = map(float, cell_match.group(1).split())
+        lattice_params = {'a': a, 'b': b, 'c': c, 'alpha': alpha, 'beta': beta, 'gamma': gamma}
+        print(f"Lattice parameters: a={lattice_params['a']:.3f}, b={lattice_params['b']:.3f}, c={lattice_params['c']:.3f}")
+        print(f"Angles: α={lattice_params['alpha']:.2f}°, β={lattice_params['beta']:.2f}°, γ={lattice_params['gamma']:.2f}°")
     
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Parse lattice parameters from CELL line
-            if line.startswith('# CELL'):
-                parts = line.split()
-                if len(parts) >= 7:
-                    lattice_params = {
-                        'a': float(parts[2]),
-                        'b': float(parts[3]),
-                        'c': float(parts[4]),
-                        'alpha': float(parts[5]),
-                        'beta': float(parts[6]),
-                        'gamma': float(parts[7])
-                    }
-                    print(f"Lattice parameters: a={lattice_params['a']:.3f}, b={lattice_params['b']:.3f}, c={lattice_params['c']:.3f}")
-                    print(f"Angles: α={lattice_params['alpha']:.2f}°, β={lattice_params['beta']:.2f}°, γ={lattice_params['gamma']:.2f}°")
-                continue
-                
-            # Check if we've reached the atom data section
-            if 'X         Y         Z         B         Occ       Spin      Charge' in line:
-                reading_atoms = True
-                continue
-            
-            if reading_atoms and line.startswith('# Atom'):
-                # Parse atom data
-                parts = line.split()
-                if len(parts) >= 10:  # Ensure we have all required fields
-                    atom_data = {
-                        'name': parts[2],
-                        'x': float(parts[3]),
-                        'y': float(parts[4]),
-                        'z': float(parts[5]),
-                        'B': float(parts[6]),
-                        'occ': float(parts[7]),
-                        'spin': float(parts[8]),
-                        'charge': float(parts[9])
-                    }
-                    atoms.append(atom_data)
+    # Collect the atom lines following the atom data header
+    header_start = text.find(ATOM_HEADER)
+    atom_lines = ATOM_LINE.findall(text, header_start) if header_start >= 0 else []
     
     if not lattice_params:
         print("Warning: No lattice parameters found in file. Using default values.")
         lattice_params = {'a': 1.0, 'b': 1.0, 'c': 1.0, 'alpha': 90.0, 'beta': 90.0, 'gamma': 90.0}
     
+    # Parse name, x, y, z, B, occ, spin, charge of all atoms in one pass
+    if not atom_lines:
+        return np.empty(0, dtype=ATOM_DTYPE), lattice_params
+    atoms = np.loadtxt(atom_lines, dtype=ATOM_DTYPE, usecols=range(2, 10), comments=None, ndmin=1)
+    
     return atoms, lattice_params
 
-def read_hkl_reflections(filename):
-    """
-    Read HKL reflection data from HKL file.
-    Returns a list of tuples containing (h, k, l, |Fc|²).
-    """
-    hkl_data = []
-    found_header = False
-    
-    with open(filename, 'r') as f:
-        for line in f:
-            if "# H   K   L     Mult    dspc                   |Fc|^2" in line:
-                found_header = True
-                continue
-            if found_header and line.strip() and not line.startswith('#'):
-                # Parse the line
-                values = line.split()
-                if len(values) >= 6:
-                    h, k, l = map(int, values[0:3])
-                    fc_squared = float(values[5])
-                    hkl_data.append((h, k, l, fc_squared))
-    
-    return hkl_data
-
 def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_cutoff=2.5, 
                auto_scale=False, target_overlap=0.1, show_overlap_info=True,
-               interactive=False):
+               interactive=False, render_mode='auto'):
     """
     Create an enhanced 3D plot of the crystal structure with atomic radii and interactive controls.
     
     Parameters:
-    - atoms: List of atom dictionaries
+    - atoms: Structured array of ATOM_DTYPE records from read_crystal_structure
     - lattice_params: Dictionary with lattice parameters (a, b, c, alpha, beta, gamma)
     - scale_factor: Multiplier for atomic radii (default: 1.0)
     - show_bonds: Whether to show bonds between atoms (default: False)
@@ -348,7 +469,17 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
     - target_overlap: Target overlap ratio for auto-scaling (default: 0.1)
     - show_overlap_info: Whether to display overlap analysis information (default: True)
     - interactive: Whether to add interactive scaling controls (default: False)
+    - render_mode: 'mesh' for triangulated spheres, 'scatter' for depth-shaded markers,
+      or 'auto' to use markers above SCATTER_ATOM_THRESHOLD atoms (default: 'auto')
     """
+    # matplotlib is imported here so --help and files without data skip its import time
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d.art3d import Poly3DCollection, Line3DCollection
+    from matplotlib.widgets import Slider, Button, TextBox
+    
+    if render_mode == 'auto':
+        render_mode = 'scatter' if len(atoms) > SCATTER_ATOM_THRESHOLD else 'mesh'
+    
     # Auto-scale if requested
     if auto_scale:
         optimal_scale, overlap_analysis = calculate_optimal_scale_factor(atoms, lattice_params, target_overlap)
@@ -359,6 +490,7 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
             print(f"  Current overlap ratio: {overlap_analysis['current_overlap_ratio']:.2%}")
             print(f"  Optimal scale factor: {optimal_scale:.3f}")
             print(f"  Overlap with optimal scale: {overlap_analysis['overlap_with_optimal']:.2%}")
+            print(f"  Overlapping atom pairs with optimal scale: {overlap_analysis['overlapping_pairs']}")
         
         scale_factor = optimal_scale
         print(f"  Using auto-calculated scale factor: {scale_factor:.3f}")
@@ -375,88 +507,75 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
     original_atoms = atoms.copy()
     current_scale = scale_factor
     
+    # Real space positions and per-atom radii and colors do not change between updates
+    atom_coords = atoms_to_real(original_atoms, lattice_params)
+    atom_elements = element_indices(original_atoms)
+    atom_radii = RADIUS_TABLE[atom_elements]
+    atom_colors = COLOR_TABLE[atom_elements]
+    xyz_min = atom_coords.min(axis=0)
+    xyz_max = atom_coords.max(axis=0)
+    max_base_radius = atom_radii.max()
+    unit_vertices, faces = _unit_sphere(sphere_resolution(len(original_atoms)))
+    
+    # Group atom indices by element type and look up each element's radius and color once
+    element_groups = group_atoms_by_element(original_atoms)
+    element_styles = {element: (float(atom_radii[indices[0]]), str(atom_colors[indices[0]]))
+                      for element, indices in element_groups.items()}
+    
+    # Bond candidates depend only on positions and cutoff, so find them once
+    if show_bonds:
+        bond_pairs = find_bond_candidates(atom_coords, bond_cutoff)
+        bond_segments = atom_coords[bond_pairs]
+        bond_lengths = np.linalg.norm(bond_segments[:, 0] - bond_segments[:, 1], axis=1)
+        bond_radius_sums = atom_radii[bond_pairs].sum(axis=1)
+    
+    # Artists are created on the first update and modified in place afterwards
+    sphere_artists = {}
+    atom_scatter = None
+    bond_lines = None
+    info_label = None
+    legend = None
+    
     def update_plot(new_scale):
         """Update the plot with new scale factor"""
-        nonlocal current_scale
+        nonlocal current_scale, atom_scatter, bond_lines, info_label, legend
         current_scale = new_scale
         
-        # Clear the plot
-        ax.clear()
-        
-        # Group atoms by element type
-        element_groups = {}
-        for atom in original_atoms:
-            element = ''.join(filter(str.isalpha, atom['name']))
-            if element not in element_groups:
-                element_groups[element] = []
-            element_groups[element].append(atom)
+        # Update atom spheres with new scale
+        legend_labels = []
         
-        # Plot atoms as 3D spheres with new scale
-        all_spheres = []
-        legend_elements = []
-        
-        for element, element_atoms in element_groups.items():
-            if not element_atoms:
-                continue
-                
+        for element, indices in element_groups.items():
             # Get element properties
-            radius = get_atomic_radius(element) * new_scale
-            color = get_element_color(element)
+            base_radius, color = element_styles[element]
+            radius = base_radius * new_scale
             
-            # Create spheres for all atoms of this element
-            for atom in element_atoms:
-                # Convert fractional coordinates to real space
-                real_center = convert_fractional_to_real((atom['x'], atom['y'], atom['z']), lattice_params)
-                # Use higher resolution for smoother spheres
-                vertices, faces = create_sphere(real_center, radius, resolution=25)
+            if render_mode == 'mesh':
+                # Triangles of the scaled unit sphere, resolution is reduced for large structures
+                sphere_triangles = (np.float32(radius) * unit_vertices)[faces]
                 
-                # Create 3D polygon collection for the sphere
-                sphere = Poly3DCollection([vertices[face] for face in faces], 
-                                        alpha=0.8, facecolor=color, edgecolor='black', linewidth=0.3)
-                ax.add_collection3d(sphere)
-                all_spheres.append(sphere)
+                # One 3D polygon collection holds the spheres of every atom of this element
+                centers = atom_coords[indices].astype(np.float32)
+                triangles = (centers[:, None, None, :] + sphere_triangles[None, :, :, :]).reshape(-1, 3, 3)
+                if element in sphere_artists:
+                    sphere_artists[element].set_verts(triangles)
+                else:
+                    spheres = Poly3DCollection(triangles, alpha=0.8, facecolor=color, edgecolor='black', linewidth=0.3)
+                    ax.add_collection3d(spheres)
+                    sphere_artists[element] = spheres
             
             # Add to legend
-            legend_elements.append(plt.Line2D([0], [0], marker='o', color='w', 
-                                            markerfacecolor=color, markersize=10, 
-                                            label=f'{element} (r={radius:.2f} Å)'))
+            legend_labels.append(f'{element} (r={radius:.2f} Å)')
         
         # Show bonds if requested
         if show_bonds:
-            bond_lines = []
-            for i, atom1 in enumerate(original_atoms):
-                for j, atom2 in enumerate(original_atoms[i+1:], i+1):
-                    # Convert fractional coordinates to real space
-                    real1 = convert_fractional_to_real((atom1['x'], atom1['y'], atom1['z']), lattice_params)
-                    real2 = convert_fractional_to_real((atom2['x'], atom2['y'], atom2['z']), lattice_params)
-                    
-                    # Calculate real space distance
-                    dx = real1[0] - real2[0]
-                    dy = real1[1] - real2[1]
-                    dz = real1[2] - real2[2]
-                    distance = math.sqrt(dx*dx + dy*dy + dz*dz)
-                    
-                    # Check if atoms are close enough to form a bond
-                    if distance <= bond_cutoff:
-                        # Get atomic radii
-                        r1 = get_atomic_radius(atom1['name']) * new_scale
-                        r2 = get_atomic_radius(atom2['name']) * new_scale
-                        
-                        # Check if atoms are actually touching (within 20% of sum of radii)
-                        if distance <= 1.2 * (r1 + r2):
-                            bond_lines.append([real1, real2])
-            
-            # Plot bonds
-            for bond in bond_lines:
-                ax.plot([bond[0][0], bond[1][0]], 
-                       [bond[0][1], bond[1][1]], 
-                       [bond[0][2], bond[1][2]], 
-                       'k-', linewidth=2, alpha=0.7)
-        
-        # Restore plot elements
-        ax.set_xlabel('X (Å)')
-        ax.set_ylabel('Y (Å)')
-        ax.set_zlabel('Z (Å)')
+            # Keep candidates whose atoms are actually touching (within 20% of sum of radii)
+            touching = bond_lengths <= 1.2 * new_scale * bond_radius_sums
+            segments = bond_segments[touching]
+            if bond_lines is not None:
+                bond_lines.set_segments(segments)
+            elif len(segments):
+                bond_lines = Line3DCollection(segments, colors='k', linewidths=2, alpha=0.7)
+                ax.add_collection3d(bond_lines)
         
         # Set title with current scale and lattice info
         title = f'Crystal Structure - Atomic Radii Scale: {new_scale:.3f}x'
@@ -464,34 +583,18 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
         title += f', α={lattice_params["alpha"]:.1f}°, β={lattice_params["beta"]:.1f}°, γ={lattice_params["gamma"]:.1f}°'
         if auto_scale:
             title += f'\nAuto-scaled, target overlap: {target_overlap:.1%}'
-        ax.set_title(title, fontsize=14, fontweight='bold')
-        
-        # Set equal aspect ratio
-        ax.set_box_aspect([1, 1, 1])
-        
-        # Auto-adjust view limits using real space coordinates
-        all_real_coords = [convert_fractional_to_real((atom['x'], atom['y'], atom['z']), lattice_params) 
-                          for atom in original_atoms]
-        all_x = [coord[0] for coord in all_real_coords]
-        all_y = [coord[1] for coord in all_real_coords]
-        all_z = [coord[2] for coord in all_real_coords]
+        ax.title.set_text(title)
         
+        # Auto-adjust view limits using the precomputed real space bounds
         # Add padding for atomic radii
-        max_radius = max([get_atomic_radius(element) * new_scale for element in element_groups.keys()])
+        max_radius = max_base_radius * new_scale
         padding = max_radius + 0.1
         
-        # Calculate ranges for each axis
-        x_range = max(all_x) - min(all_x)
-        y_range = max(all_y) - min(all_y)
-        z_range = max(all_z) - min(all_z)
-        
         # Find the maximum range to ensure equal scaling
-        max_range = max(x_range, y_range, z_range) + 2 * padding
+        max_range = (xyz_max - xyz_min).max() + 2 * padding
         
         # Center the plot and set equal limits
-        x_center = (min(all_x) + max(all_x)) / 2
-        y_center = (min(all_y) + max(all_y)) / 2
-        z_center = (min(all_z) + max(all_z)) / 2
+        x_center, y_center, z_center = (xyz_min + xyz_max) / 2
         
         half_range = max_range / 2
         
@@ -499,28 +602,63 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
         ax.set_ylim([y_center - half_range, y_center + half_range])
         ax.set_zlim([z_center - half_range, z_center + half_range])
         
-        # Add grid
-        ax.grid(True, alpha=0.3)
+        if render_mode == 'scatter':
+            # Draw every atom with a single marker collection, sized so that the
+            # marker diameter roughly matches the atomic diameter on screen
+            axes_width_points = ax.get_position().width * fig.get_figwidth() * 72
+            points_per_angstrom = 0.6 * axes_width_points / max_range
+            sizes = (2 * atom_radii * new_scale * points_per_angstrom) ** 2
+            if atom_scatter is None:
+                atom_scatter = ax.scatter(atom_coords[:, 0], atom_coords[:, 1], atom_coords[:, 2], s=sizes,
+                                          c=atom_colors, alpha=0.8, edgecolors='black', linewidths=0.3,
+                                          depthshade=True)
+            else:
+                atom_scatter.set_sizes(sizes)
         
         # Add scale factor information at top-left, aligned with status box
         if show_overlap_info:
             info_text = f'Scale Factor: {new_scale:.3f}x\n'
             info_text += f'Real Space Range:\n'
-            info_text += f'X: {min(all_x):.2f} to {max(all_x):.2f} Å\n'
-            info_text += f'Y: {min(all_y):.2f} to {max(all_y):.2f} Å\n'
-            info_text += f'Z: {min(all_z):.2f} to {max(all_z):.2f} Å\n'
+            info_text += f'X: {xyz_min[0]:.2f} to {xyz_max[0]:.2f} Å\n'
+            info_text += f'Y: {xyz_min[1]:.2f} to {xyz_max[1]:.2f} Å\n'
+            info_text += f'Z: {xyz_min[2]:.2f} to {xyz_max[2]:.2f} Å\n'
             info_text += f'Max Radius: {max_radius:.3f} Å'
             
-            ax.text2D(0.05, 0.95, info_text, transform=ax.transAxes, fontsize=10,
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8),
-                      verticalalignment='top')
+            if info_label is None:
+                info_label = ax.text2D(0.05, 0.95, info_text, transform=ax.transAxes, fontsize=10,
+                                       bbox=dict(boxstyle='round', facecolor='white', alpha=0.8),
+                                       verticalalignment='top')
+            else:
+                info_label.set_text(info_text)
         
-        # Add legend
-        ax.legend(handles=legend_elements, loc='upper right')
+        # Add the legend once, later updates only change the radii in its labels
+        if legend is None:
+            legend_elements = [plt.Line2D([0], [0], marker='o', color='w',
+                                          markerfacecolor=element_styles[element][1], markersize=10,
+                                          label=label)
+                               for element, label in zip(element_groups, legend_labels)]
+            legend = ax.legend(handles=legend_elements, loc='upper right')
+        else:
+            for text, label in zip(legend.get_texts(), legend_labels):
+                text.set_text(label)
         
         # Redraw
         fig.canvas.draw_idle()
     
+    # Set up the static parts of the plot once
+    ax.set_xlabel('X (Å)')
+    ax.set_ylabel('Y (Å)')
+    ax.set_zlabel('Z (Å)')
+    
+    # Set equal aspect ratio
+    ax.set_box_aspect([1, 1, 1])
+    
+    # Add grid
+    ax.grid(True, alpha=0.3)
+    
+    # Title font is set once, updates only change the text
+    ax.set_title('', fontsize=14, fontweight='bold')
+    
     # Initial plot
     update_plot(scale_factor)
     
@@ -551,27 +689,39 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
         ax_status = plt.axes([0.02, 0.82, 0.12, 0.04])
         status_textbox = TextBox(ax_status, 'Status:', initial='Ready')
         
+        # Coalesce rapid slider changes into a single sphere update once the user pauses
+        update_timer = fig.canvas.new_timer(interval=50)
+        update_timer.single_shot = True
+        update_timer.add_callback(lambda: update_plot(scale_slider.val))
+        
+        def show_status(text):
+            """Set the status text, TextBox.set_val would force an immediate full draw"""
+            status_textbox.text_disp.set_text(text)
+            fig.canvas.draw_idle()
+        
         # Connect controls
         def on_scale_change(val):
-            update_plot(val)
-            status_textbox.set_val(f'Scale: {val:.3f}x')
+            # The slider requests its own redraw, so only the text is set here
+            status_textbox.text_disp.set_text(f'Scale: {val:.3f}x')
+            update_timer.stop()
+            update_timer.start()
         
         def on_reset_click(event):
             scale_slider.set_val(1.0)
-            status_textbox.set_val('Reset to 1.0x')
+            show_status('Reset to 1.0x')
         
         def on_auto_click(event):
             if auto_scale:
                 optimal_scale, _ = calculate_optimal_scale_factor(original_atoms, lattice_params, target_overlap)
                 scale_slider.set_val(optimal_scale)
-                status_textbox.set_val(f'Auto-scaled: {optimal_scale:.3f}x')
+                show_status(f'Auto-scaled: {optimal_scale:.3f}x')
             else:
-                status_textbox.set_val('Auto-scale not enabled')
+                show_status('Auto-scale not enabled')
         
         def on_optimal_click(event):
             optimal_scale, _ = calculate_optimal_scale_factor(original_atoms, lattice_params, 0.0)  # No overlap
             scale_slider.set_val(optimal_scale)
-            status_textbox.set_val(f'Optimal (no overlap): {optimal_scale:.3f}x')
+            show_status(f'Optimal (no overlap): {optimal_scale:.3f}x')
         
         scale_slider.on_changed(on_scale_change)
         reset_button.on_clicked(on_reset_click)
@@ -579,7 +729,7 @@ def plot_atoms(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_c
         optimal_button.on_clicked(on_optimal_click)
         
         # Initial status
-        status_textbox.set_val(f'Initial scale: {scale_factor:.3f}x')
+        show_status(f'Initial scale: {scale_factor:.3f}x')
     
     # Show the plot
     plt.tight_layout()
@@ -589,37 +739,77 @@ def plot_reflections(hkl_data, initial_size=50):
     """
     Create a 3D plot of the crystal reflections with enhanced interactive controls.
     """
+    # matplotlib is imported here so --help and files without data skip its import time
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Slider, Button, TextBox
+    from matplotlib.colors import Normalize
+    from matplotlib.cm import ScalarMappable
+    
     # Create figure and 3D axes with extra space for controls
     fig = plt.figure(figsize=(16, 14))
     ax = fig.add_subplot(111, projection='3d')
     
-    # Extract coordinates and sizes
-    h = np.array([x[0] for x in hkl_data])
-    k = np.array([x[1] for x in hkl_data])
-    l = np.array([x[2] for x in hkl_data])
-    sizes = np.array([x[3] for x in hkl_data])
+    # Sort reflections by L, highest first, so that every filtered subset is
+    # already in a consistent drawing order
+    hkl_data = hkl_data[np.argsort(-hkl_data['l'], kind='stable')]
+    
+    # Extract coordinates and sizes as column views of the reflection records
+    h = hkl_data['h']
+    k = hkl_data['k']
+    l = hkl_data['l']
+    sizes = hkl_data['fc2']
     
     # Store max_size for normalization
     max_size = np.max(sizes)
     
-    # Calculate initial sizes
-    initial_sizes = initial_size * (sizes / max_size)
+    # Normalize the sizes once, updates only scale them by the size factor
+    norm_sizes = (sizes / max_size).astype(np.float32)
     
-    # Create scatter plot
-    scatter = ax.scatter(h, k, l, 
-                        s=initial_sizes,
+    # Calculate initial sizes
+    initial_sizes = initial_size * norm_sizes
+    
+    # Map intensities to colors once, the color scale spans the whole dataset.
+    # Each reflection stores a uint8 index into the colormap's lookup table,
+    # which selects the same color the colormap would for the normalized value
+    color_norm = Normalize(vmin=np.min(sizes), vmax=max_size)
+    colormap = plt.get_cmap('viridis')
+    color_lut = colormap(np.arange(colormap.N)).astype(np.float32)
+    color_index = np.minimum(color_norm(sizes) * colormap.N, colormap.N - 1).astype(np.uint8)
+    
+    # Very large sets draw only the strongest reflections as sized, colored markers.
+    # The weaker bulk shares one color and size in a single line artist, which is
+    # much cheaper to redraw than a marker collection
+    if len(hkl_data) > BULK_REFLECTION_THRESHOLD:
+        is_strong = np.zeros(len(hkl_data), dtype=bool)
+        is_strong[np.argpartition(sizes, -STRONG_REFLECTION_COUNT)[-STRONG_REFLECTION_COUNT:]] = True
+        weak = ~is_strong
+        bulk_line, = ax.plot(h[weak], k[weak], l[weak], linestyle='', marker='.', markersize=2,
+                             color='lightgray', alpha=0.3, rasterized=True)
+    else:
+        is_strong = np.ones(len(hkl_data), dtype=bool)
+        bulk_line = None
+    
+    # Create scatter plot, large sets skip stroking marker edges and are
+    # rasterized when saved to vector formats
+    large = len(hkl_data) > RASTER_REFLECTION_THRESHOLD
+    scatter = ax.scatter(h[is_strong], k[is_strong], l[is_strong], 
+                        s=initial_sizes[is_strong],
                         alpha=0.6,
-                        c=sizes,
-                        cmap='viridis')
+                        c=color_lut[color_index[is_strong]],
+                        depthshade=False,
+                        linewidths=0 if large else None,
+                        rasterized=large)
     
     # Add colorbar
-    colorbar = plt.colorbar(scatter, label='|Fc|²')
+    colorbar = plt.colorbar(ScalarMappable(norm=color_norm, cmap=colormap), ax=ax, alpha=0.6, label='|Fc|²')
     
     # Set labels and title
     ax.set_xlabel('H')
     ax.set_ylabel('K')
     ax.set_zlabel('L')
-    ax.set_title(f'Crystal Reflections Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})')
+    # Title and status texts shared by the initial plot and the update paths
+    initial_title = f'Crystal Reflections Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})'
+    ax.set_title(initial_title)
     
     # Set equal aspect ratio
     ax.set_box_aspect([1,1,1])
@@ -699,22 +889,128 @@ def plot_reflections(hkl_data, initial_size=50):
     
     # Status text box
     status_ax = plt.axes([0.65, 0.12, 0.3, 0.08])
-    status_textbox = TextBox(status_ax, 'Status:', initial=f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
+    all_status = f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}'
+    status_textbox = TextBox(status_ax, 'Status:', initial=all_status)
     
     # Store original data for filtering
     original_h = h.copy()
     original_k = k.copy()
     original_l = l.copy()
     original_sizes = sizes.copy()
-    original_indices = np.arange(len(hkl_data))
+    # Reflection positions fit in int32, which halves the index traffic of every gather
+    original_indices = np.arange(len(hkl_data), dtype=np.int32)
+    
+    # Order the reflections by H once, so that a filter finds its H range by binary
+    # search and only tests the reflections inside it
+    h_order = np.argsort(original_h, kind='stable').astype(np.int32)
+    h_by_h = original_h[h_order]
+    k_by_h = original_k[h_order]
+    l_by_h = original_l[h_order]
+    sizes_by_h = original_sizes[h_order]
+    
+    # Filters write their mask into this buffer instead of allocating a new one
+    mask_buffer = np.empty(len(hkl_data), dtype=np.bool_)
+    
+    # Build the filter once up front so that a compiled kernel is ready before the first slider move
+    reflection_mask(h_by_h, k_by_h, l_by_h, sizes_by_h,
+                    (h_min, h_max), (k_min, k_max), (l_min, l_max), intensity_min, out=mask_buffer)
+    
+    # Blitting: the scatter, title and status text are animated, so full draws cache a
+    # background without them and filter updates only redraw these artists on top.
+    # Canvases that cannot blit keep the artists in the regular draw and use draw_idle
+    animated_artists = [scatter, ax.title, status_textbox.text_disp]
+    if bulk_line is not None:
+        # Drawn first so that the strong reflections stay on top
+        animated_artists.insert(0, bulk_line)
+    if fig.canvas.supports_blit:
+        for artist in animated_artists:
+            artist.set_animated(True)
+    background = None
+    
+    def draw_animated():
+        """Draw the animated artists with the current 3D projection"""
+        scatter.do_3d_projection()
+        for artist in animated_artists:
+            fig.draw_artist(artist)
+    
+    def on_draw(event):
+        """Cache the static background after every full draw, e.g. on resize or rotation"""
+        nonlocal background
+        if fig.canvas.is_saving():
+            # Animated artists are part of the regular draw when saving
+            return
+        background = fig.canvas.copy_from_bbox(fig.bbox)
+        draw_animated()
+    
+    if fig.canvas.supports_blit:
+        fig.canvas.mpl_connect('draw_event', on_draw)
+    
+    # Reflections currently shown and their marker sizes
+    shown_indices = original_indices
+    shown_sizes = initial_sizes
+    rotating = False
+    
+    def set_scatter_data(indices, new_sizes):
+        """Show the given reflections, thinned out to a subsample while the view is rotated"""
+        nonlocal shown_indices, shown_sizes
+        shown_indices, shown_sizes = indices, new_sizes
+        if rotating:
+            step = len(indices) // ROTATION_POINT_LIMIT + 1
+            indices, new_sizes = indices[::step], new_sizes[::step]
+        if bulk_line is not None:
+            weak = indices[~is_strong[indices]]
+            weak_h, weak_k, weak_l = original_h[weak], original_k[weak], original_l[weak]
+            
+            # Level of detail: keep the weak reflections inside the current view limits
+            # and thin them to BULK_POINT_LIMIT, so zooming in brings back full detail
+            in_view = reflection_mask(weak_h, weak_k, weak_l, original_sizes[weak],
+                                      ax.get_xlim(), ax.get_ylim(), ax.get_zlim(), -np.inf)
+            weak_h, weak_k, weak_l = weak_h[in_view], weak_k[in_view], weak_l[in_view]
+            step = len(weak_h) // BULK_POINT_LIMIT + 1
+            bulk_line.set_data_3d(weak_h[::step], weak_k[::step], weak_l[::step])
+            
+            strong = is_strong[indices]
+            indices, new_sizes = indices[strong], new_sizes[strong]
+        scatter._offsets3d = (original_h[indices], original_k[indices], original_l[indices])
+        scatter.set_sizes(new_sizes)
+        scatter.set_facecolor(color_lut[color_index[indices]])
+    
+    def on_press(event):
+        """Draw a subsample while the mouse rotates or zooms the 3D view"""
+        nonlocal rotating
+        if event.inaxes is not ax or len(shown_indices) <= ROTATION_POINT_LIMIT:
+            return
+        rotating = True
+        set_scatter_data(shown_indices, shown_sizes)
+    
+    def on_release(event):
+        """Restore the full set of reflections once the mouse is released"""
+        nonlocal rotating
+        if not rotating:
+            return
+        rotating = False
+        set_scatter_data(shown_indices, shown_sizes)
+        fig.canvas.draw_idle()
+    
+    fig.canvas.mpl_connect('button_press_event', on_press)
+    fig.canvas.mpl_connect('button_release_event', on_release)
     
-    # Store colorbar reference to avoid overplotting
-    current_colorbar = colorbar
+    if bulk_line is not None:
+        # Apply the level of detail to the initial view
+        set_scatter_data(original_indices, initial_sizes)
+    
+    def redraw():
+        """Show changes to the animated artists, blitting once a background is cached"""
+        if background is None:
+            fig.canvas.draw_idle()
+        else:
+            # Only the animated artists changed, redraw them over the cached background
+            fig.canvas.restore_region(background)
+            draw_animated()
+            fig.canvas.blit(fig.bbox)
     
     def update_display():
         """Update display based on current filter settings"""
-        nonlocal current_colorbar
-        
         # Get current range values
         h_min_val = h_min_slider.val
         h_max_val = h_max_slider.val
@@ -725,84 +1021,100 @@ def plot_reflections(hkl_data, initial_size=50):
         intensity_threshold = intensity_slider.val
         size_factor = size_slider.val
         
-        # Filter data based on ranges
-        mask = ((original_h >= h_min_val) & (original_h <= h_max_val) &
-                (original_k >= k_min_val) & (original_k <= k_max_val) &
-                (original_l >= l_min_val) & (original_l <= l_max_val) &
-                (original_sizes >= intensity_threshold))
+        # Filter data based on ranges, testing only the reflections in the H range
+        lo = np.searchsorted(h_by_h, h_min_val, side='left')
+        hi = max(np.searchsorted(h_by_h, h_max_val, side='right'), lo)
+        if (k_min_val <= k_min and k_max_val >= k_max and l_min_val <= l_min and l_max_val >= l_max
+                and intensity_threshold <= intensity_min):
+            # The other sliders exclude nothing, so the H range alone is the selection
+            if lo == 0 and hi == len(h_order):
+                filtered_indices = original_indices
+            else:
+                filtered_indices = np.sort(h_order[lo:hi])
+        else:
+            mask = reflection_mask(h_by_h[lo:hi], k_by_h[lo:hi], l_by_h[lo:hi], sizes_by_h[lo:hi],
+                                   (h_min_val, h_max_val), (k_min_val, k_max_val), (l_min_val, l_max_val),
+                                   intensity_threshold, out=mask_buffer[:hi - lo])
+            
+            # Sorting the indices restores the drawing order by L
+            filtered_indices = np.sort(h_order[lo:hi][mask])
         
-        filtered_indices = original_indices[mask]
+        # Calculate new sizes
+        new_sizes = size_factor * norm_sizes[filtered_indices]
         
-        # Remove existing colorbar to avoid overplotting
-        if current_colorbar is not None:
-            current_colorbar.remove()
+        # Update the existing scatter plot in place instead of rebuilding the axes
+        set_scatter_data(filtered_indices, new_sizes)
         
         if len(filtered_indices) > 0:
-            # Update scatter plot with filtered data
-            h_filtered = original_h[filtered_indices]
-            k_filtered = original_k[filtered_indices]
-            l_filtered = original_l[filtered_indices]
-            sizes_filtered = original_sizes[filtered_indices]
-            
-            # Calculate new sizes
-            new_sizes = size_factor * (sizes_filtered / max_size)
-            
-            # Clear previous scatter plot and create new one
-            ax.clear()
-            
-            # Recreate the scatter plot
-            new_scatter = ax.scatter(h_filtered, k_filtered, l_filtered, 
-                                   s=new_sizes, c=sizes_filtered, cmap='viridis', 
-                                   alpha=0.6)
-            
-            # Create new colorbar
-            current_colorbar = plt.colorbar(new_scatter, label='|Fc|²')
-            
-            # Restore labels and title
-            ax.set_xlabel('H')
-            ax.set_ylabel('K')
-            ax.set_zlabel('L')
-            ax.set_title(f'Crystal Reflections Visualization\nSphere size proportional to |Fc|² (size factor: {int(size_factor)})')
+            # Change only the title text, set_title would reset the position found at draw time
+            ax.title.set_text(f'Crystal Reflections Visualization\nSphere size proportional to |Fc|² (size factor: {int(size_factor)})')
             
-            # Restore grid and aspect ratio
-            ax.grid(True)
-            ax.set_box_aspect([1,1,1])
-            
-            # Restore HKL info text
-            ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                      transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-            
-            # Update status
-            status_textbox.set_val(f'Showing {len(filtered_indices)} reflections\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
+            # Update status, setting the text directly since TextBox.set_val forces a full draw
+            status_textbox.text_disp.set_text(f'Showing {len(filtered_indices)} reflections\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
         else:
-            # Clear scatter plot if no data matches
-            ax.clear()
-            current_colorbar = None
-            
-            # Restore labels and title
-            ax.set_xlabel('H')
-            ax.set_ylabel('K')
-            ax.set_zlabel('L')
-            ax.set_title(f'Crystal Reflections Visualization\nNo reflections match criteria')
-            
-            # Restore grid and aspect ratio
-            ax.grid(True)
-            ax.set_box_aspect([1,1,1])
-            
-            # Restore HKL info text
-            ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                      transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+            ax.title.set_text(f'Crystal Reflections Visualization\nNo reflections match criteria')
             
-            status_textbox.set_val(f'No reflections match criteria\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
+            status_textbox.text_disp.set_text(f'No reflections match criteria\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
+        
+        redraw()
+    
+    # Coalesce rapid slider changes into a single update once the user pauses
+    update_timer = fig.canvas.new_timer(interval=50)
+    update_timer.single_shot = True
+    update_timer.add_callback(update_display)
+    
+    if bulk_line is not None:
+        # Re-thin the weak reflections once the view limits stop changing
+        view_timer = fig.canvas.new_timer(interval=50)
+        view_timer.single_shot = True
+        
+        def refresh_view():
+            """Redraw the shown reflections with the detail level of the current view"""
+            set_scatter_data(shown_indices, shown_sizes)
+            redraw()
         
+        def on_view_change(changed_ax):
+            """Schedule a detail update after a zoom or pan, rotation drags update on release"""
+            if not rotating:
+                view_timer.stop()
+                view_timer.start()
+        
+        view_timer.add_callback(refresh_view)
+        for limits in ('xlim_changed', 'ylim_changed', 'zlim_changed'):
+            ax.callbacks.connect(limits, on_view_change)
+    
+    suspend_updates = False
+    
+    def schedule_update(val):
+        """Restart the update timer so that a slider drag triggers one update"""
+        if suspend_updates:
+            return
+        update_timer.stop()
+        update_timer.start()
+    
+    def set_sliders(slider_values):
+        """Set several sliders without triggering an update or redraw for each of them"""
+        nonlocal suspend_updates
+        suspend_updates = True
+        try:
+            for slider, value in slider_values:
+                slider.drawon = False
+                slider.set_val(value)
+                slider.drawon = True
+        finally:
+            suspend_updates = False
         fig.canvas.draw_idle()
     
+    def show_all():
+        """Show every reflection at the initial size, reusing the existing scatter"""
+        set_scatter_data(original_indices, initial_sizes)
+        
+        ax.title.set_text(initial_title)
+        status_textbox.text_disp.set_text(all_status)
+        redraw()
+    
     def toggle_visibility(event):
         """Toggle between showing all data and filtered data"""
-        nonlocal current_colorbar
-        
         if toggle_button.label.get_text() == 'Show All':
             # Show filtered data
             toggle_button.label.set_text('Show Filtered')
@@ -810,49 +1122,21 @@ def plot_reflections(hkl_data, initial_size=50):
         else:
             # Show all data
             toggle_button.label.set_text('Show All')
-            
-            # Remove existing colorbar to avoid overplotting
-            if current_colorbar is not None:
-                current_colorbar.remove()
-            
-            # Clear and recreate with all data
-            ax.clear()
-            
-            # Recreate scatter plot with all data
-            all_scatter = ax.scatter(original_h, original_k, original_l, 
-                                   s=initial_sizes, c=original_sizes, cmap='viridis', 
-                                   alpha=0.6)
-            
-            # Create new colorbar
-            current_colorbar = plt.colorbar(all_scatter, label='|Fc|²')
-            
-            # Restore labels and title
-            ax.set_xlabel('H')
-            ax.set_ylabel('K')
-            ax.set_zlabel('L')
-            ax.set_title(f'Crystal Reflections Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})')
-            
-            # Restore grid and aspect ratio
-            ax.grid(True)
-            ax.set_box_aspect([1,1,1])
-            
-            # Restore HKL info text
-            ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                      transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-            
-            status_textbox.set_val(f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
-            fig.canvas.draw_idle()
+            show_all()
+        
+        # The button label is not animated, so it needs a full draw
+        fig.canvas.draw_idle()
+    
+    # Sliders and the values that remove all filtering
+    full_ranges = [(h_min_slider, h_min), (h_max_slider, h_max),
+                   (k_min_slider, k_min), (k_max_slider, k_max),
+                   (l_min_slider, l_min), (l_max_slider, l_max),
+                   (intensity_slider, intensity_min)]
     
     def reset_ranges(event):
         """Reset all range sliders to full range"""
-        h_min_slider.set_val(h_min)
-        h_max_slider.set_val(h_max)
-        k_min_slider.set_val(k_min)
-        k_max_slider.set_val(k_max)
-        l_min_slider.set_val(l_min)
-        l_max_slider.set_val(l_max)
-        intensity_slider.set_val(intensity_min)
+        set_sliders(full_ranges)
+        update_display()
     
     def reset_size(event):
         """Reset size slider to initial value"""
@@ -860,44 +1144,13 @@ def plot_reflections(hkl_data, initial_size=50):
     
     def clear_filter(event):
         """Clear all filters and show all data"""
-        nonlocal current_colorbar
-        
-        reset_ranges(event)
-        reset_size(event)
+        set_sliders(full_ranges + [(size_slider, initial_size)])
         toggle_button.label.set_text('Show All')
         
-        # Remove existing colorbar to avoid overplotting
-        if current_colorbar is not None:
-            current_colorbar.remove()
-        
-        # Clear and recreate with all data
-        ax.clear()
-        
-        # Recreate scatter plot with all data
-        all_scatter = ax.scatter(original_h, original_k, original_l, 
-                               s=initial_sizes, c=original_sizes, cmap='viridis', 
-                               alpha=0.6)
-        
-        # Create new colorbar
-        current_colorbar = plt.colorbar(all_scatter, label='|Fc|²')
-        
-        # Restore labels and title
-        ax.set_xlabel('H')
-        ax.set_ylabel('K')
-        ax.set_zlabel('L')
-        ax.set_title(f'Crystal Reflections Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})')
-        
-        # Restore grid and aspect ratio
-        ax.grid(True)
-        ax.set_box_aspect([1,1,1])
-        
-        # Restore HKL info text
-        ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                  transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                  bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-        
-        status_textbox.set_val(f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
-        fig.canvas.draw_idle()
+        # Filter with the reset sliders now instead of waiting for an update still pending
+        # from an earlier slider move
+        update_timer.stop()
+        update_display()
     
     def set_preset_size(factor):
         def handler(event):
@@ -905,14 +1158,9 @@ def plot_reflections(hkl_data, initial_size=50):
         return handler
     
     # Connect sliders and buttons
-    h_min_slider.on_changed(lambda val: update_display())
-    h_max_slider.on_changed(lambda val: update_display())
-    k_min_slider.on_changed(lambda val: update_display())
-    k_max_slider.on_changed(lambda val: update_display())
-    l_min_slider.on_changed(lambda val: update_display())
-    l_max_slider.on_changed(lambda val: update_display())
-    intensity_slider.on_changed(lambda val: update_display())
-    size_slider.on_changed(lambda val: update_display())
+    for slider in (h_min_slider, h_max_slider, k_min_slider, k_max_slider,
+                   l_min_slider, l_max_slider, intensity_slider, size_slider):
+        slider.on_changed(schedule_update)
     
     toggle_button.on_clicked(toggle_visibility)
     reset_ranges_button.on_clicked(reset_ranges)
@@ -955,25 +1203,32 @@ def main():
                        help='Hide overlap analysis information')
     parser.add_argument('-i', '--interactive', action='store_true',
                        help='Enable interactive atomic radius scaling controls')
+    parser.add_argument('-r', '--render', choices=['auto', 'mesh', 'scatter'], default='auto',
+                       help=f'Atom rendering: triangulated spheres (mesh) or depth-shaded markers (scatter); '
+                            f'auto uses markers above {SCATTER_ATOM_THRESHOLD} atoms (default: auto)')
+    parser.add_argument('--bin', type=int, default=1,
+                       help='Sum reflections over BIN x BIN x BIN blocks of HKL before plotting, '
+                            'for very large reflection files (default: 1, no binning)')
     
     args = parser.parse_args()
     
     try:
         if args.mode == 'atoms':
             atoms, lattice_params = read_crystal_structure(args.filename)
-            if not atoms:
+            if len(atoms) == 0:
                 print("No atom data found in the file or incorrect format.")
                 return
             plot_atoms(atoms, lattice_params, scale_factor=args.scale, 
                       show_bonds=args.bonds, bond_cutoff=args.cutoff,
                       auto_scale=args.auto_scale, target_overlap=args.overlap,
                       show_overlap_info=not args.no_overlap_info,
-                      interactive=args.interactive)
+                      interactive=args.interactive, render_mode=args.render)
         else:  # reflections mode
             hkl_data = read_hkl_reflections(args.filename)
-            if not hkl_data:
+            if len(hkl_data) == 0:
                 print("No reflection data found in the file or incorrect format.")
                 return
+            hkl_data = bin_reflections(hkl_data, args.bin)
             plot_reflections(hkl_data, args.size)
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -2,11 +2,22 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection, Line3DCollection
 from matplotlib.widgets import Slider, Button, TextBox
 import argparse
+import mmap
+import os
 import math
+import re
+import functools
+import string
+
+# numba is optional; without it pair searches use full NumPy distance matrices
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 # Comprehensive atomic radius data (in Angstroms)
 # Data compiled from various sources including:
@@ -50,12 +61,7 @@ ATOMIC_RADII = {
     'Tl': 1.70, 'Pb': 1.54, 'Bi': 1.54, 'Po': 1.68, 'At': 1.40, 'Rn': 1.34,
     
     # Other important elements
-    'H': 0.31, 'He': 0.28, 'Be': 1.12, 'B': 0.85, 'C': 0.70, 'N': 0.65,
-    'O': 0.60, 'F': 0.50, 'Ne': 0.38, 'Al': 1.43, 'Si': 1.17, 'P': 1.10,
-    'S': 1.04, 'Cl': 0.99, 'Ar': 0.71, 'Ga': 1.22, 'Ge': 1.22, 'As': 1.19,
-    'Se': 1.17, 'Br': 1.14, 'Kr': 1.03, 'In': 1.63, 'Sn': 1.46, 'Sb': 1.46,
-    'Te': 1.47, 'I': 1.40, 'Xe': 1.24, 'Tl': 1.70, 'Pb': 1.54, 'Bi': 1.54,
-    'Po': 1.68, 'At': 1.40, 'Rn': 1.34
+    'H': 0.31, 'He': 0.28
 }
 
 # Element colors for visualization (based on common conventions)
@@ -87,75 +93,122 @@ ELEMENT_COLORS = {
     'Md': '#B30DA6', 'No': '#BD0D87', 'Lr': '#C70066'
 }
 
+# Radius and color lookup tables indexed by integer element index
+# The final slot holds the defaults used for unknown elements
+ELEMENT_SYMBOLS = sorted(set(ATOMIC_RADII) | set(ELEMENT_COLORS))
+ELEMENT_INDEX = {symbol: i for i, symbol in enumerate(ELEMENT_SYMBOLS)}
+UNKNOWN_ELEMENT = len(ELEMENT_SYMBOLS)
+RADIUS_TABLE = np.array([ATOMIC_RADII.get(symbol, 1.0) for symbol in ELEMENT_SYMBOLS] + [1.0])
+COLOR_TABLE = np.array([ELEMENT_COLORS.get(symbol, '#808080') for symbol in ELEMENT_SYMBOLS] + ['#808080'])
+
+# Atom records returned by read_crystal_structure
+ATOM_DTYPE = np.dtype([('name', 'U16'), ('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+                       ('B', 'f8'), ('occ', 'f8'), ('spin', 'f8'), ('charge', 'f8')])
+
+# Lines of interest in the HKL file header
+CELL_LINE = re.compile(r'^[ \t]*# CELL((?:[ \t]+\S+){6})', re.MULTILINE)
+ATOM_HEADER = 'X         Y         Z         B         Occ       Spin      Charge'
+# Atom line with all required fields: "# Atom <name> x y z B occ spin charge"
+ATOM_LINE = re.compile(r'^[ \t]*# Atom(?:[ \t]+\S+){8}', re.MULTILINE)
+REFLECTION_HEADER = b'# H   K   L     Mult    dspc                   |Fc|^2'
+
+# Approximate number of sphere triangles drawn for the whole structure
+SPHERE_TRIANGLE_BUDGET = 100000
+
 def read_crystal_structure(filename):
     """
     Read crystal structure data from HKL file.
     Returns a tuple of (atoms, lattice_params) where:
-    - atoms: list of dictionaries containing atom information
+    - atoms: structured array of ATOM_DTYPE records, one per atom
     - lattice_params: dictionary with a, b, c, alpha, beta, gamma
     """
-    atoms = []
+    with open(filename, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            text = ''
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # The CELL and atom lines precede the reflection table, so only
+                # the header part of the file is read and decoded
+                table_start = mm.find(REFLECTION_HEADER)
+                text = mm[:table_start if table_start >= 0 else len(mm)].decode()
+    
+    # Parse lattice parameters from CELL line
     lattice_params = {}
-    reading_atoms = False
+    cell_match = CELL_LINE.search(text)
+    if cell_match:
+        a, b, c, alpha, beta, gamma = map(float, cell_match.group(1).split())
+        lattice_params = {'a': a, 'b': b, 'c': c, 'alpha': alpha, 'beta': beta, 'gamma': gamma}
+        print(f"Lattice parameters: a={lattice_params['a']:.3f}, b={lattice_params['b']:.3f}, c={lattice_params['c']:.3f}")
+        print(f"Angles: α={lattice_params['alpha']:.2f}°, β={lattice_params['beta']:.2f}°, γ={lattice_params['gamma']:.2f}°")
     
-    with open(filename, 'r') as f:
-        for line in f:
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Parse lattice parameters from CELL line
-            if line.startswith('# CELL'):
-                parts = line.split()
-                if len(parts) >= 7:
-                    lattice_params = {
-                        'a': float(parts[2]),
-                        'b': float(parts[3]),
-                        'c': float(parts[4]),
-                        'alpha': float(parts[5]),
-                        'beta': float(parts[6]),
-                        'gamma': float(parts[7])
-                    }
-                    print(f"Lattice parameters: a={lattice_params['a']:.3f}, b={lattice_params['b']:.3f}, c={lattice_params['c']:.3f}")
-                    print(f"Angles: α={lattice_params['alpha']:.2f}°, β={lattice_params['beta']:.2f}°, γ={lattice_params['gamma']:.2f}°")
-                continue
-                
-            # Check if we've reached the atom data section
-            if 'X         Y         Z         B         Occ       Spin      Charge' in line:
-                reading_atoms = True
-                continue
-            
-            if reading_atoms and line.startswith('# Atom'):
-                # Parse atom data
-                parts = line.split()
-                if len(parts) >= 10:  # Ensure we have all required fields
-                    atom_data = {
-                        'name': parts[2],
-                        'x': float(parts[3]),
-                        'y': float(parts[4]),
-                        'z': float(parts[5]),
-                        'B': float(parts[6]),
-                        'occ': float(parts[7]),
-                        'spin': float(parts[8]),
-                        'charge': float(parts[9])
-                    }
-                    atoms.append(atom_data)
+    # Collect the atom lines following the atom data header
+    header_start = text.find(ATOM_HEADER)
+    atom_lines = ATOM_LINE.findall(text, header_start) if header_start >= 0 else []
     
     if not lattice_params:
         print("Warning: No lattice parameters found in file. Using default values.")
         lattice_params = {'a': 1.0, 'b': 1.0, 'c': 1.0, 'alpha': 90.0, 'beta': 90.0, 'gamma': 90.0}
     
+    # Parse name, x, y, z, B, occ, spin, charge of all atoms in one pass
+    if not atom_lines:
+        return np.empty(0, dtype=ATOM_DTYPE), lattice_params
+    atoms = np.loadtxt(atom_lines, dtype=ATOM_DTYPE, usecols=range(2, 10), comments=None, ndmin=1)
+    
     return atoms, lattice_params
 
+# Translation table removing the digits, signs and punctuation of atom labels
+_LABEL_NON_ALPHA = str.maketrans('', '', string.digits + string.punctuation + string.whitespace)
+
+@functools.lru_cache(maxsize=256)
+def _element_of(atom_name):
+    """
+    Return the element symbol of an atom name, e.g. 'Si' for 'Si1'.
+    """
+    return atom_name.translate(_LABEL_NON_ALPHA)
+
+def element_symbols(atoms):
+    """
+    Return a string array with the element symbol of every atom, e.g. 'Si' for 'Si1'.
+    """
+    return np.char.translate(atoms['name'], _LABEL_NON_ALPHA)
+
+def element_indices(atoms):
+    """
+    Return an integer array of lookup table indices, one per atom.
+    """
+    # Look up each distinct element once and scatter the result back to the atoms
+    symbols, inverse = np.unique(element_symbols(atoms), return_inverse=True)
+    lookup = np.array([ELEMENT_INDEX.get(str(symbol), UNKNOWN_ELEMENT) for symbol in symbols], dtype=np.intp)
+    for symbol in symbols[lookup == UNKNOWN_ELEMENT]:
+        # Prints the unknown element warning once per symbol
+        get_atomic_radius(str(symbol))
+    return lookup[inverse.ravel()]
+
+def group_atoms_by_element(atoms):
+    """
+    Group atoms by element symbol.
+    Returns a dictionary mapping each element, in order of first appearance,
+    to an integer array of the indices of its atoms.
+    """
+    unique, first, inverse = np.unique(element_symbols(atoms), return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    
+    # Split the atom indices, sorted by element, at the element boundaries
+    # instead of comparing every atom against every element
+    order = np.argsort(inverse, kind='stable')
+    groups = np.split(order, np.cumsum(np.bincount(inverse, minlength=len(unique)))[:-1])
+    return {str(unique[i]): groups[i] for i in np.argsort(first)}
+
+@functools.lru_cache(maxsize=256)
 def get_atomic_radius(element_symbol):
     """
     Get atomic radius for a given element symbol.
-    Returns a default radius if element not found.
+    Returns a default radius if element not found. Results are cached, so the
+    unknown element warning is printed once per symbol.
     """
     # Extract element symbol (remove numbers)
-    element = ''.join(filter(str.isalpha, element_symbol))
+    element = _element_of(element_symbol)
     
     if element in ATOMIC_RADII:
         return ATOMIC_RADII[element]
@@ -164,13 +217,14 @@ def get_atomic_radius(element_symbol):
         print(f"Warning: Unknown element '{element}', using default radius 1.0 Å")
         return 1.0
 
+@functools.lru_cache(maxsize=256)
 def get_element_color(element_symbol):
     """
     Get color for a given element symbol.
     Returns a default color if element not found.
     """
     # Extract element symbol (remove numbers)
-    element = ''.join(filter(str.isalpha, element_symbol))
+    element = _element_of(element_symbol)
     
     if element in ELEMENT_COLORS:
         return ELEMENT_COLORS[element]
@@ -178,55 +232,156 @@ def get_element_color(element_symbol):
         # Default color for unknown elements
         return '#808080'  # Gray
 
-def convert_fractional_to_real(fractional_coords, lattice_params):
+def is_orthogonal_cell(lattice_params):
     """
-    Convert fractional coordinates to real space coordinates using lattice parameters.
+    Check whether all three cell angles are 90 degrees.
+    """
+    return lattice_params['alpha'] == lattice_params['beta'] == lattice_params['gamma'] == 90.0
+
+def build_orth_matrix(lattice_params):
+    """
+    Build the 3x3 orthogonalization matrix that maps fractional coordinates
+    to real space coordinates.
     
     Parameters:
-    - fractional_coords: tuple of (x, y, z) fractional coordinates
     - lattice_params: dictionary with a, b, c, alpha, beta, gamma
     
     Returns:
-    - real_coords: tuple of (x, y, z) real space coordinates in Angstroms
+    - M: (3, 3) array such that real = M @ frac
     """
-    x_frac, y_frac, z_frac = fractional_coords
     a, b, c = lattice_params['a'], lattice_params['b'], lattice_params['c']
     alpha, beta, gamma = lattice_params['alpha'], lattice_params['beta'], lattice_params['gamma']
     
-    # Convert angles to radians
-    alpha_rad = math.radians(alpha)
-    beta_rad = math.radians(beta)
-    gamma_rad = math.radians(gamma)
-    
-    # Calculate volume of unit cell
-    V = a * b * c * math.sqrt(1 - math.cos(alpha_rad)**2 - math.cos(beta_rad)**2 - math.cos(gamma_rad)**2 + 
-                                2 * math.cos(alpha_rad) * math.cos(beta_rad) * math.cos(gamma_rad))
-    
-    # Calculate reciprocal lattice parameters
-    a_star = b * c * math.sin(alpha_rad) / V
-    b_star = a * c * math.sin(beta_rad) / V
-    c_star = a * b * math.sin(gamma_rad) / V
+    # Cubic, tetragonal and orthorhombic cells only scale each axis
+    if is_orthogonal_cell(lattice_params):
+        return np.diag([a, b, c])
     
-    # Calculate cosines of reciprocal angles
-    cos_alpha_star = (math.cos(beta_rad) * math.cos(gamma_rad) - math.cos(alpha_rad)) / (math.sin(beta_rad) * math.sin(gamma_rad))
-    cos_beta_star = (math.cos(alpha_rad) * math.cos(gamma_rad) - math.cos(beta_rad)) / (math.sin(alpha_rad) * math.sin(gamma_rad))
-    cos_gamma_star = (math.cos(alpha_rad) * math.cos(beta_rad) - math.cos(gamma_rad)) / (math.sin(alpha_rad) * math.sin(beta_rad))
+    # Convert angles to radians
+    cos_alpha = math.cos(math.radians(alpha))
+    cos_beta = math.cos(math.radians(beta))
+    sin_beta = math.sin(math.radians(beta))
+    cos_gamma = math.cos(math.radians(gamma))
+    sin_gamma = math.sin(math.radians(gamma))
+    
+    # Same convention as convert_fractional_to_real in crystal3D.py, so both
+    # tools place the atoms of a cell at the same coordinates
+    return np.array([
+        [a, b * cos_gamma, c * cos_beta],
+        [0.0, b * sin_gamma, c * (cos_alpha - cos_beta * cos_gamma) / sin_gamma],
+        [0.0, 0.0, c * sin_beta]
+    ])
+
+def convert_fractional_to_real(fractional_coords, lattice_params):
+    """
+    Convert fractional coordinates to real space coordinates using lattice parameters.
     
-    # Convert fractional to real coordinates
-    x_real = a * x_frac + b * math.cos(gamma_rad) * y_frac + c * math.cos(beta_rad) * z_frac
-    y_real = b * math.sin(gamma_rad) * y_frac + c * (math.cos(alpha_rad) - math.cos(beta_rad) * math.cos(gamma_rad)) / math.sin(gamma_rad) * z_frac
-    z_real = c * math.sin(beta_rad) * z_frac
+    Parameters:
+    - fractional_coords: tuple of (x, y, z) fractional coordinates
+    - lattice_params: dictionary with a, b, c, alpha, beta, gamma
     
+    Returns:
+    - real_coords: tuple of (x, y, z) real space coordinates in Angstroms
+    """
+    x_real, y_real, z_real = build_orth_matrix(lattice_params) @ np.asarray(fractional_coords, dtype=float)
     return (x_real, y_real, z_real)
 
-def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
+def atoms_to_real(atoms, lattice_params):
+    """
+    Convert the fractional coordinates of all atoms to an (N, 3) array of
+    real space coordinates in Angstroms.
+    """
+    frac = np.column_stack((atoms['x'], atoms['y'], atoms['z']))
+    if is_orthogonal_cell(lattice_params):
+        # Diagonal matrix, scale the columns in place instead of a matrix product
+        frac *= [lattice_params['a'], lattice_params['b'], lattice_params['c']]
+        return frac
+    return frac @ build_orth_matrix(lattice_params).T
+
+def distance_matrix(real_coords):
+    """
+    Calculate the (N, N) matrix of distances between all pairs of real space coordinates.
+    """
+    diff = real_coords[:, None, :] - real_coords[None, :, :]
+    return np.sqrt((diff * diff).sum(axis=-1))
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True)
+    def _min_pair_distance_sq(coords):
+        """
+        Return the smallest squared distance between any two rows of coords.
+        """
+        n = coords.shape[0]
+        row_min = np.full(n, np.inf)
+        for i in prange(n):
+            local_min = np.inf
+            for j in range(i + 1, n):
+                dx = coords[i, 0] - coords[j, 0]
+                dy = coords[i, 1] - coords[j, 1]
+                dz = coords[i, 2] - coords[j, 2]
+                d2 = dx*dx + dy*dy + dz*dz
+                if d2 < local_min:
+                    local_min = d2
+            row_min[i] = local_min
+        return row_min.min()
+    
+    @njit(parallel=True)
+    def _pairs_within(coords, cutoff):
+        """
+        Return an (M, 2) array of the index pairs i < j closer than cutoff.
+        """
+        n = coords.shape[0]
+        cutoff_sq = cutoff * cutoff
+        
+        # First pass counts the pairs of every row so the second pass can
+        # write its rows in parallel without materializing all N² pairs
+        counts = np.zeros(n + 1, dtype=np.int64)
+        for i in prange(n):
+            count = 0
+            for j in range(i + 1, n):
+                dx = coords[i, 0] - coords[j, 0]
+                dy = coords[i, 1] - coords[j, 1]
+                dz = coords[i, 2] - coords[j, 2]
+                if dx*dx + dy*dy + dz*dz <= cutoff_sq:
+                    count += 1
+            counts[i + 1] = count
+        offsets = np.cumsum(counts)
+        
+        pairs = np.empty((offsets[n], 2), dtype=np.int32)
+        for i in prange(n):
+            row = offsets[i]
+            for j in range(i + 1, n):
+                dx = coords[i, 0] - coords[j, 0]
+                dy = coords[i, 1] - coords[j, 1]
+                dz = coords[i, 2] - coords[j, 2]
+                if dx*dx + dy*dy + dz*dz <= cutoff_sq:
+                    pairs[row, 0] = i
+                    pairs[row, 1] = j
+                    row += 1
+        return pairs
+else:
+    def _min_pair_distance_sq(coords):
+        """
+        Return the smallest squared distance between any two rows of coords.
+        """
+        dist_sq = distance_matrix(coords) ** 2
+        np.fill_diagonal(dist_sq, np.inf)
+        return dist_sq.min()
+    
+    def _pairs_within(coords, cutoff):
+        """
+        Return an (M, 2) array of the index pairs i < j closer than cutoff.
+        """
+        return np.argwhere(np.triu(distance_matrix(coords) <= cutoff, 1)).astype(np.int32)
+
+def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1, real_coords=None):
     """
     Calculate optimal scale factor to reduce overlapping while maintaining visibility.
     
     Parameters:
-    - atoms: List of atom dictionaries
+    - atoms: Structured array of ATOM_DTYPE records
     - lattice_params: Dictionary with lattice parameters
     - target_overlap: Target overlap ratio (0.0 = no overlap, 1.0 = full overlap)
+    - real_coords: Optional (N, 3) real space coordinates from atoms_to_real, computed if not given
     
     Returns:
     - optimal_scale: Recommended scale factor
@@ -235,31 +390,17 @@ def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
     if len(atoms) < 2:
         return 1.0, {}
     
-    # Calculate distances between all atom pairs in real space
-    distances = []
-    for i, atom1 in enumerate(atoms):
-        for j, atom2 in enumerate(atoms[i+1:], i+1):
-            # Convert fractional coordinates to real space
-            real1 = convert_fractional_to_real((atom1['x'], atom1['y'], atom1['z']), lattice_params)
-            real2 = convert_fractional_to_real((atom2['x'], atom2['y'], atom2['z']), lattice_params)
-            
-            # Calculate real space distance
-            dx = real1[0] - real2[0]
-            dy = real1[1] - real2[1]
-            dz = real1[2] - real2[2]
-            distance = math.sqrt(dx*dx + dy*dy + dz*dz)
-            distances.append(distance)
-    
-    if not distances:
-        return 1.0, {}
+    # Convert fractional coordinates to real space for all atoms at once
+    if real_coords is None:
+        real_coords = atoms_to_real(atoms, lattice_params)
     
     # Get atomic radii
-    radii = [get_atomic_radius(atom['name']) for atom in atoms]
-    min_radius = min(radii)
-    max_radius = max(radii)
+    radii = RADIUS_TABLE[element_indices(atoms)]
+    min_radius = float(radii.min())
+    max_radius = float(radii.max())
     
     # Calculate current overlap with scale factor 1.0
-    min_distance = min(distances)
+    min_distance = math.sqrt(_min_pair_distance_sq(real_coords))
     max_radius_sum = 2 * max_radius
     
     # Calculate optimal scale factor based on target overlap
@@ -295,6 +436,51 @@ def calculate_optimal_scale_factor(atoms, lattice_params, target_overlap=0.1):
     
     return optimal_scale, overlap_analysis
 
+@functools.lru_cache(maxsize=8)
+def _unit_sphere(resolution):
+    """
+    Create a triangulated unit sphere centred on the origin.
+    
+    The mesh is cached per resolution and shared between callers, so the
+    returned arrays are read-only.
+    """
+    # Generate spherical coordinates, theta along rows and phi along columns
+    phi = np.linspace(0, 2 * np.pi, resolution)[None, :]
+    theta = np.linspace(0, np.pi, resolution)[:, None]
+    sin_theta = np.sin(theta)
+    
+    # Convert to Cartesian coordinates
+    vertices = np.empty((resolution, resolution, 3))
+    vertices[..., 0] = sin_theta * np.cos(phi)
+    vertices[..., 1] = sin_theta * np.sin(phi)
+    vertices[..., 2] = np.cos(theta)
+    vertices = vertices.reshape(-1, 3)
+    
+    # Calculate indices for every grid cell at once
+    i, j = np.mgrid[:resolution - 1, :resolution - 1]
+    idx1 = (i * resolution + j).ravel()
+    idx2 = idx1 + 1
+    idx3 = idx1 + resolution
+    idx4 = idx3 + 1
+    
+    # Add two triangles for each grid cell
+    faces = np.empty((2 * idx1.size, 3), dtype=np.int32)
+    faces[0::2] = np.stack([idx1, idx2, idx3], axis=1)
+    faces[1::2] = np.stack([idx2, idx4, idx3], axis=1)
+    
+    vertices.setflags(write=False)
+    faces.setflags(write=False)
+    return vertices, faces
+
+def sphere_resolution(n_atoms, max_resolution=25):
+    """
+    Choose a sphere mesh resolution that keeps the total triangle count of
+    n_atoms spheres near SPHERE_TRIANGLE_BUDGET.
+    """
+    # A sphere of resolution r has 2 * (r - 1)**2 triangles
+    resolution = int(math.sqrt(SPHERE_TRIANGLE_BUDGET / (2 * max(n_atoms, 1)))) + 1
+    return max(6, min(max_resolution, resolution))
+
 def create_sphere(center, radius, resolution=20):
     """
     Create a 3D sphere using triangulation.
@@ -306,43 +492,10 @@ def create_sphere(center, radius, resolution=20):
     
     Returns:
     - vertices: array of 3D points
-    - faces: array of triangular faces
+    - faces: (K, 3) int32 array of triangular faces
     """
-    # Generate spherical coordinates
-    phi = np.linspace(0, 2 * np.pi, resolution)
-    theta = np.linspace(0, np.pi, resolution)
-    
-    # Create meshgrid
-    phi_grid, theta_grid = np.meshgrid(phi, theta)
-    
-    # Convert to Cartesian coordinates
-    x = center[0] + radius * np.sin(theta_grid) * np.cos(phi_grid)
-    y = center[1] + radius * np.sin(theta_grid) * np.sin(phi_grid)
-    z = center[2] + radius * np.cos(theta_grid)
-    
-    # Flatten arrays
-    x_flat = x.flatten()
-    y_flat = y.flatten()
-    z_flat = z.flatten()
-    
-    # Create vertices array
-    vertices = np.column_stack((x_flat, y_flat, z_flat))
-    
-    # Create triangular faces
-    faces = []
-    for i in range(resolution - 1):
-        for j in range(resolution - 1):
-            # Calculate indices for current grid cell
-            idx1 = i * resolution + j
-            idx2 = i * resolution + (j + 1)
-            idx3 = (i + 1) * resolution + j
-            idx4 = (i + 1) * resolution + (j + 1)
-            
-            # Add two triangles for each grid cell
-            faces.append([idx1, idx2, idx3])
-            faces.append([idx2, idx4, idx3])
-    
-    return vertices, faces
+    unit_vertices, faces = _unit_sphere(resolution)
+    return np.asarray(center, dtype=float) + radius * unit_vertices, faces
 
 def plot_crystal_structure(atoms, lattice_params, scale_factor=1.0, show_bonds=False, bond_cutoff=2.5, 
                           auto_scale=False, target_overlap=0.1, show_overlap_info=True,
@@ -351,7 +504,7 @@ def plot_crystal_structure(atoms, lattice_params, scale_factor=1.0, show_bonds=F
     Create a 3D plot of the crystal structure with atoms as 3D spheres.
     
     Parameters:
-    - atoms: List of atom dictionaries
+    - atoms: Structured array of ATOM_DTYPE records
     - lattice_params: Dictionary with lattice parameters (a, b, c, alpha, beta, gamma)
     - scale_factor: Multiplier for atomic radii (default: 1.0)
     - show_bonds: Whether to show bonds between atoms (default: False)
@@ -361,9 +514,13 @@ def plot_crystal_structure(atoms, lattice_params, scale_factor=1.0, show_bonds=F
     - show_overlap_info: Whether to display overlap analysis information (default: True)
     - interactive: Whether to add interactive scaling controls (default: False)
     """
+    # Atom positions do not depend on the scale, so convert them once
+    real_coords = atoms_to_real(atoms, lattice_params)
+    
     # Auto-scale if requested
     if auto_scale:
-        optimal_scale, overlap_analysis = calculate_optimal_scale_factor(atoms, lattice_params, target_overlap)
+        optimal_scale, overlap_analysis = calculate_optimal_scale_factor(atoms, lattice_params, target_overlap,
+                                                                         real_coords=real_coords)
         if show_overlap_info:
             print(f"\nOverlap Analysis:")
             print(f"  Minimum interatomic distance: {overlap_analysis['min_distance']:.3f} Å")
@@ -387,88 +544,78 @@ def plot_crystal_structure(atoms, lattice_params, scale_factor=1.0, show_bonds=F
     original_atoms = atoms.copy()
     current_scale = scale_factor
     
+    if show_bonds:
+        # Atoms within the cutoff are bond candidates at any scale, so only
+        # the touching test below depends on the slider
+        base_radii = RADIUS_TABLE[element_indices(original_atoms)]
+        bond_pairs = _pairs_within(real_coords, bond_cutoff)
+        bond_segments = real_coords[bond_pairs]
+        bond_lengths = np.linalg.norm(bond_segments[:, 0] - bond_segments[:, 1], axis=1)
+        bond_radius_sums = base_radii[bond_pairs].sum(axis=1)
+    
+    # Real space extent of the structure for the view limits
+    coord_min = real_coords.min(axis=0)
+    coord_max = real_coords.max(axis=0)
+    coord_center = (coord_min + coord_max) / 2
+    coord_range = (coord_max - coord_min).max()
+    
+    # Group atoms by element type
+    element_groups = group_atoms_by_element(original_atoms)
+    
+    # Element properties do not depend on the scale either
+    element_styles = {element: (get_atomic_radius(element), get_element_color(element))
+                      for element in element_groups}
+    max_base_radius = max(base_radius for base_radius, _ in element_styles.values())
+    
+    # Triangles of the unit sphere, smooth for small cells and coarser for
+    # large ones so the triangle count stays within budget
+    unit_vertices, faces = _unit_sphere(sphere_resolution(len(original_atoms)))
+    unit_triangles = unit_vertices[faces]
+    
+    # Artists are created on the first update and modified in place afterwards
+    sphere_artists = {}
+    bond_lines = None
+    info_label = None
+    legend = None
+    
     def update_plot(new_scale):
         """Update the plot with new scale factor"""
-        nonlocal current_scale
+        nonlocal current_scale, bond_lines, info_label, legend
         current_scale = new_scale
         
-        # Clear the plot
-        ax.clear()
-        
-        # Group atoms by element type
-        element_groups = {}
-        for atom in original_atoms:
-            element = ''.join(filter(str.isalpha, atom['name']))
-            if element not in element_groups:
-                element_groups[element] = []
-            element_groups[element].append(atom)
-        
-        # Plot atoms as 3D spheres with new scale
-        all_spheres = []
-        legend_elements = []
+        # Update atom spheres with new scale
+        legend_labels = []
         
         for element, element_atoms in element_groups.items():
-            if not element_atoms:
-                continue
-                
             # Get element properties
-            radius = get_atomic_radius(element) * new_scale
-            color = get_element_color(element)
+            base_radius, color = element_styles[element]
+            radius = base_radius * new_scale
             
-            # Create spheres for all atoms of this element
-            for atom in element_atoms:
-                # Convert fractional coordinates to real space
-                real_center = convert_fractional_to_real((atom['x'], atom['y'], atom['z']), lattice_params)
-                # Use higher resolution for smoother spheres
-                vertices, faces = create_sphere(real_center, radius, resolution=25)
-                
-                # Create 3D polygon collection for the sphere
-                sphere = Poly3DCollection([vertices[face] for face in faces], 
-                                        alpha=0.8, facecolor=color, edgecolor='black', linewidth=0.3)
-                ax.add_collection3d(sphere)
-                all_spheres.append(sphere)
+            # One 3D polygon collection holds the spheres of every atom of this element
+            centers = real_coords[element_atoms]
+            triangles = (centers[:, None, None, :] + radius * unit_triangles[None, :, :, :]).reshape(-1, 3, 3)
+            if element in sphere_artists:
+                sphere_artists[element].set_verts(triangles)
+            else:
+                spheres = Poly3DCollection(triangles, alpha=0.8, facecolor=color, edgecolor='black', linewidth=0.3)
+                ax.add_collection3d(spheres)
+                sphere_artists[element] = spheres
             
             # Add to legend
-            legend_elements.append(plt.Line2D([0], [0], marker='o', color='w', 
-                                            markerfacecolor=color, markersize=10, 
-                                            label=f'{element} (r={radius:.2f} Å)'))
+            legend_labels.append(f'{element} (r={radius:.2f} Å)')
         
         # Show bonds if requested
         if show_bonds:
-            bond_lines = []
-            for i, atom1 in enumerate(original_atoms):
-                for j, atom2 in enumerate(original_atoms[i+1:], i+1):
-                    # Convert fractional coordinates to real space
-                    real1 = convert_fractional_to_real((atom1['x'], atom1['y'], atom1['z']), lattice_params)
-                    real2 = convert_fractional_to_real((atom2['x'], atom2['y'], atom2['z']), lattice_params)
-                    
-                    # Calculate real space distance
-                    dx = real1[0] - real2[0]
-                    dy = real1[1] - real2[1]
-                    dz = real1[2] - real2[2]
-                    distance = math.sqrt(dx*dx + dy*dy + dz*dz)
-                    
-                    # Check if atoms are close enough to form a bond
-                    if distance <= bond_cutoff:
-                        # Get atomic radii
-                        r1 = get_atomic_radius(atom1['name']) * new_scale
-                        r2 = get_atomic_radius(atom2['name']) * new_scale
-                        
-                        # Check if atoms are actually touching (within 20% of sum of radii)
-                        if distance <= 1.2 * (r1 + r2):
-                            bond_lines.append([real1, real2])
+            # Keep candidates whose atoms are actually touching (within 20% of sum of radii)
+            touching = bond_lengths <= 1.2 * new_scale * bond_radius_sums
+            segments = bond_segments[touching]
             
-            # Plot bonds
-            for bond in bond_lines:
-                ax.plot([bond[0][0], bond[1][0]], 
-                       [bond[0][1], bond[1][1]], 
-                       [bond[0][2], bond[1][2]], 
-                       'k-', linewidth=2, alpha=0.7)
-        
-        # Restore plot elements
-        ax.set_xlabel('X (Å)')
-        ax.set_ylabel('Y (Å)')
-        ax.set_zlabel('Z (Å)')
+            # Plot all bonds as a single collection
+            if bond_lines is not None:
+                bond_lines.set_segments(segments)
+            elif len(segments):
+                bond_lines = Line3DCollection(segments, colors='k', linewidths=2, alpha=0.7)
+                ax.add_collection3d(bond_lines)
         
         # Set title with current scale and lattice info
         title = f'Crystal Structure - Atomic Radii Scale: {new_scale:.3f}x'
@@ -476,63 +623,68 @@ def plot_crystal_structure(atoms, lattice_params, scale_factor=1.0, show_bonds=F
         title += f', α={lattice_params["alpha"]:.1f}°, β={lattice_params["beta"]:.1f}°, γ={lattice_params["gamma"]:.1f}°'
         if auto_scale:
             title += f'\nAuto-scaled, target overlap: {target_overlap:.1%}'
-        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.title.set_text(title)
         
         # Auto-adjust view limits using real space coordinates
-        all_real_coords = [convert_fractional_to_real((atom['x'], atom['y'], atom['z']), lattice_params) 
-                          for atom in original_atoms]
-        all_x = [coord[0] for coord in all_real_coords]
-        all_y = [coord[1] for coord in all_real_coords]
-        all_z = [coord[2] for coord in all_real_coords]
-        
         # Add padding for atomic radii
-        max_radius = max([get_atomic_radius(element) * new_scale for element in element_groups.keys()])
+        max_radius = max_base_radius * new_scale
         padding = max_radius + 0.1
         
-        # Calculate ranges for each axis
-        x_range = max(all_x) - min(all_x)
-        y_range = max(all_y) - min(all_y)
-        z_range = max(all_z) - min(all_z)
-        
         # Find the maximum range to ensure equal scaling
-        max_range = max(x_range, y_range, z_range) + 2 * padding
+        max_range = coord_range + 2 * padding
         
         # Center the plot and set equal limits
-        x_center = (min(all_x) + max(all_x)) / 2
-        y_center = (min(all_y) + max(all_y)) / 2
-        z_center = (min(all_z) + max(all_z)) / 2
-        
         half_range = max_range / 2
+        x_center, y_center, z_center = coord_center
         
         ax.set_xlim([x_center - half_range, x_center + half_range])
         ax.set_ylim([y_center - half_range, y_center + half_range])
         ax.set_zlim([z_center - half_range, z_center + half_range])
         
-        # Set equal aspect ratio to maintain spherical appearance
-        ax.set_box_aspect([1, 1, 1])
-        
-        # Add grid
-        ax.grid(True, alpha=0.3)
-        
         # Add scale factor information at top-left, aligned with status box
         if show_overlap_info:
             info_text = f'Scale Factor: {new_scale:.3f}x\n'
             info_text += f'Real Space Range:\n'
-            info_text += f'X: {min(all_x):.2f} to {max(all_x):.2f} Å\n'
-            info_text += f'Y: {min(all_y):.2f} to {max(all_y):.2f} Å\n'
-            info_text += f'Z: {min(all_z):.2f} to {max(all_z):.2f} Å\n'
+            info_text += f'X: {coord_min[0]:.2f} to {coord_max[0]:.2f} Å\n'
+            info_text += f'Y: {coord_min[1]:.2f} to {coord_max[1]:.2f} Å\n'
+            info_text += f'Z: {coord_min[2]:.2f} to {coord_max[2]:.2f} Å\n'
             info_text += f'Max Radius: {max_radius:.3f} Å'
             
-            ax.text2D(0.05, 0.95, info_text, transform=ax.transAxes, fontsize=10,
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8),
-                      verticalalignment='top')
+            if info_label is None:
+                info_label = ax.text2D(0.05, 0.95, info_text, transform=ax.transAxes, fontsize=10,
+                                       bbox=dict(boxstyle='round', facecolor='white', alpha=0.8),
+                                       verticalalignment='top')
+            else:
+                info_label.set_text(info_text)
         
-        # Add legend
-        ax.legend(handles=legend_elements, loc='upper right')
+        # Add the legend once, later updates only change the radii in its labels
+        if legend is None:
+            legend_elements = [plt.Line2D([0], [0], marker='o', color='w', 
+                                          markerfacecolor=element_styles[element][1], markersize=10, 
+                                          label=label)
+                               for element, label in zip(element_groups, legend_labels)]
+            legend = ax.legend(handles=legend_elements, loc='upper right')
+        else:
+            for text, label in zip(legend.get_texts(), legend_labels):
+                text.set_text(label)
         
         # Redraw
         fig.canvas.draw_idle()
     
+    # Set up the static parts of the plot once
+    ax.set_xlabel('X (Å)')
+    ax.set_ylabel('Y (Å)')
+    ax.set_zlabel('Z (Å)')
+    
+    # Set equal aspect ratio to maintain spherical appearance
+    ax.set_box_aspect([1, 1, 1])
+    
+    # Add grid
+    ax.grid(True, alpha=0.3)
+    
+    # Title font is set once, updates only change the text
+    ax.set_title('', fontsize=14, fontweight='bold')
+    
     # Initial plot
     update_plot(scale_factor)
     
@@ -574,14 +726,16 @@ def plot_crystal_structure(atoms, lattice_params, scale_factor=1.0, show_bonds=F
         
         def on_auto_click(event):
             if auto_scale:
-                optimal_scale, _ = calculate_optimal_scale_factor(original_atoms, lattice_params, target_overlap)
+                optimal_scale, _ = calculate_optimal_scale_factor(original_atoms, lattice_params, target_overlap,
+                                                                  real_coords=real_coords)
                 scale_slider.set_val(optimal_scale)
                 status_textbox.set_val(f'Auto-scaled: {optimal_scale:.3f}x')
             else:
                 status_textbox.set_val('Auto-scale not enabled')
         
         def on_optimal_click(event):
-            optimal_scale, _ = calculate_optimal_scale_factor(original_atoms, lattice_params, 0.0)  # No overlap
+            optimal_scale, _ = calculate_optimal_scale_factor(original_atoms, lattice_params, 0.0,  # No overlap
+                                                              real_coords=real_coords)
             scale_slider.set_val(optimal_scale)
             status_textbox.set_val(f'Optimal (no overlap): {optimal_scale:.3f}x')
         
@@ -616,12 +770,7 @@ def print_atomic_info(atoms, lattice_params, scale_factor=1.0):
     print(f"γ = {lattice_params['gamma']:.2f}°")
     
     # Group atoms by element
-    element_counts = {}
-    for atom in atoms:
-        element = ''.join(filter(str.isalpha, atom['name']))
-        if element not in element_counts:
-            element_counts[element] = []
-        element_counts[element].append(atom)
+    element_counts = group_atoms_by_element(atoms)
     
     print(f"\nElement composition:")
     print("-" * 40)
@@ -635,12 +784,16 @@ def print_atomic_info(atoms, lattice_params, scale_factor=1.0):
     print("\tX\t\tY\t\tZ\t\tX\t\tY\t\tZ")
     print("-" * 80)
     
-    for atom in atoms:
-        element = ''.join(filter(str.isalpha, atom['name']))
-        radius = get_atomic_radius(element) * scale_factor
-        real_coords = convert_fractional_to_real((atom['x'], atom['y'], atom['z']), lattice_params)
-        print(f"{atom['name']:6s}\t{atom['x']:8.6f}\t{atom['y']:8.6f}\t{atom['z']:8.6f}\t"
-              f"{real_coords[0]:8.2f}\t{real_coords[1]:8.2f}\t{real_coords[2]:8.2f}\t{radius:8.2f}")
+    all_real_coords = atoms_to_real(atoms, lattice_params)
+    all_radii = RADIUS_TABLE[element_indices(atoms)] * scale_factor
+    
+    # Format the rows from plain Python values and write the table at once
+    rows = [f"{name:6s}\t{x:8.6f}\t{y:8.6f}\t{z:8.6f}\t"
+            f"{x_real:8.2f}\t{y_real:8.2f}\t{z_real:8.2f}\t{radius:8.2f}"
+            for (name, x, y, z, *_), (x_real, y_real, z_real), radius
+            in zip(atoms.tolist(), all_real_coords.tolist(), all_radii.tolist())]
+    if rows:
+        print('\n'.join(rows))
 
 def main():
     # Set up argument parser
@@ -666,7 +819,7 @@ def main():
     # Read and process the crystal structure
     atoms, lattice_params = read_crystal_structure(args.input_file)
     
-    if not atoms:
+    if len(atoms) == 0:
         print("Error: No atomic data found in the file.")
         return
     
@@ -0,0 +1,147 @@
+import numpy as np
+import io
+import mmap
+import os
+import functools
+
+# Reflection reading and filtering shared by crystal3D.py and hkl_reflections.py.
+# Only numpy is imported at load time, so importing this module keeps --help fast;
+# numba is optional and only imported when a filter is first applied.
+
+REFLECTION_HEADER = b'# H   K   L     Mult    dspc                   |Fc|^2'
+
+# Reflection records only feed the display, so Miller indices are stored as int16
+# and intensities in single precision
+REFLECTION_DTYPE = np.dtype([('h', 'i2'), ('k', 'i2'), ('l', 'i2'), ('fc2', 'f4')])
+
+# Most reflections drawn while the 3D view is being rotated
+ROTATION_POINT_LIMIT = 2000
+# Above this many reflections, markers are drawn without edges and saved as a raster image
+RASTER_REFLECTION_THRESHOLD = 5000
+
+@functools.lru_cache(maxsize=8)
+def _read_hkl_reflections(path, mtime_ns):
+    """
+    Parse the reflection table of an HKL file.
+    mtime_ns is only part of the cache key, so an edited file is parsed again.
+    """
+    with open(path, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            table = b''
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Find the reflection table header without reading the file line by line
+                header_start = mm.find(REFLECTION_HEADER)
+                table_start = mm.find(b'\n', header_start) + 1 if header_start >= 0 else 0
+                table = mm[table_start:] if table_start > 0 else b''
+    
+    # Parse the h, k, l and |Fc|^2 columns straight into reflection records
+    if not table.strip():
+        reflections = np.empty(0, dtype=REFLECTION_DTYPE)
+    else:
+        reflections = np.loadtxt(io.BytesIO(table), dtype=REFLECTION_DTYPE, usecols=(0, 1, 2, 5),
+                                 comments='#', ndmin=1)
+    # The cached array is shared by every caller reading the same file
+    reflections.setflags(write=False)
+    return reflections
+
+def read_hkl_reflections(filename):
+    """
+    Read HKL reflection data from HKL file.
+    Returns a read-only structured array of REFLECTION_DTYPE records (h, k, l, fc2),
+    where fc2 is |Fc|². Reading an unchanged file again returns the cached records.
+    """
+    path = os.path.abspath(filename)
+    return _read_hkl_reflections(path, os.stat(path).st_mtime_ns)
+
+def _numpy_mask(conditions, mask):
+    """
+    Fill mask with the AND of (values, compare, bound) conditions.
+    """
+    # Evaluate each condition into one scratch buffer and combine in place,
+    # so a filter allocates one boolean array however many conditions it has
+    (values, compare, bound), rest = conditions[0], conditions[1:]
+    compare(values, bound, out=mask)
+    test = np.empty_like(mask)
+    for values, compare, bound in rest:
+        compare(values, bound, out=test)
+        mask &= test
+
+def _numpy_hkl_range_mask(h, k, l, bounds, mask):
+    _numpy_mask(((h, np.greater_equal, bounds[0]), (h, np.less_equal, bounds[1]),
+                 (k, np.greater_equal, bounds[2]), (k, np.less_equal, bounds[3]),
+                 (l, np.greater_equal, bounds[4]), (l, np.less_equal, bounds[5])), mask)
+
+def _numpy_reflection_mask(h, k, l, fc2, bounds, intensity_min, mask):
+    _numpy_mask(((h, np.greater_equal, bounds[0]), (h, np.less_equal, bounds[1]),
+                 (k, np.greater_equal, bounds[2]), (k, np.less_equal, bounds[3]),
+                 (l, np.greater_equal, bounds[4]), (l, np.less_equal, bounds[5]),
+                 (fc2, np.greater_equal, intensity_min)), mask)
+
+@functools.lru_cache(maxsize=None)
+def _mask_kernels():
+    """
+    Return the (hkl_range_mask, reflection_mask) kernels, compiled with numba when
+    it is installed. The bounds are (h_min, h_max, k_min, k_max, l_min, l_max).
+    """
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return _numpy_hkl_range_mask, _numpy_reflection_mask
+
+    @njit(parallel=True)
+    def hkl_range_kernel(h, k, l, bounds, mask):
+        for i in prange(h.shape[0]):
+            mask[i] = (bounds[0] <= h[i] <= bounds[1] and
+                       bounds[2] <= k[i] <= bounds[3] and
+                       bounds[4] <= l[i] <= bounds[5])
+
+    @njit(parallel=True)
+    def reflection_kernel(h, k, l, fc2, bounds, intensity_min, mask):
+        for i in prange(h.shape[0]):
+            mask[i] = (bounds[0] <= h[i] <= bounds[1] and
+                       bounds[2] <= k[i] <= bounds[3] and
+                       bounds[4] <= l[i] <= bounds[5] and
+                       fc2[i] >= intensity_min)
+
+    return hkl_range_kernel, reflection_kernel
+
+def hkl_range_mask(h, k, l, h_range, k_range, l_range, out=None):
+    """
+    Select reflections by H, K, L ranges only, for callers that have already
+    cut the intensities by other means.
+    
+    Parameters:
+    - h, k, l: Miller index arrays
+    - h_range, k_range, l_range: (min, max) tuples, bounds included
+    - out: Optional boolean array of the same length to write the mask into
+    
+    Returns:
+    - Boolean array, True for the reflections to show
+    """
+    if out is None:
+        out = np.empty(len(h), dtype=np.bool_)
+    bounds = np.array([*h_range, *k_range, *l_range], dtype=np.float64)
+    _mask_kernels()[0](h, k, l, bounds, out)
+    return out
+
+def reflection_mask(h, k, l, fc2, h_range, k_range, l_range, intensity_min, out=None):
+    """
+    Select reflections by H, K, L ranges and minimum intensity.
+    
+    Parameters:
+    - h, k, l: Miller index arrays
+    - fc2: |Fc|² intensity array
+    - h_range, k_range, l_range: (min, max) tuples, bounds included
+    - intensity_min: Minimum |Fc|² to keep
+    - out: Optional boolean array of the same length to write the mask into
+    
+    Returns:
+    - Boolean array, True for the reflections to show
+    """
+    if out is None:
+        out = np.empty(len(h), dtype=np.bool_)
+    bounds = np.array([*h_range, *k_range, *l_range], dtype=np.float64)
+    _mask_kernels()[1](h, k, l, fc2, bounds, float(intensity_min), out)
+    return out
@@ -1,57 +1,59 @@
 #!/usr/bin/env python3
 import numpy as np
 import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 import sys
-import re
 import argparse
 from matplotlib.widgets import Slider, Button, TextBox
+from matplotlib.colors import Normalize
+from matplotlib.cm import ScalarMappable
 
-def read_hkl_file(filename):
-    hkl_data = []
-    found_header = False
-    
-    with open(filename, 'r') as f:
-        for line in f:
-            if "# H   K   L     Mult    dspc                   |Fc|^2" in line:
-                found_header = True
-                continue
-            if found_header and line.strip() and not line.startswith('#'):
-                # Parse the line
-                values = line.split()
-                if len(values) >= 6:
-                    h, k, l = map(int, values[0:3])
-                    fc_squared = float(values[5])
-                    hkl_data.append((h, k, l, fc_squared))
-    
-    return hkl_data
+# The reflection reader, filter and large-set limits are shared with crystal3D.py,
+# so both tools parse and filter HKL files the same way
+from hkl_io import (read_hkl_reflections as read_hkl_file, hkl_range_mask,
+                    ROTATION_POINT_LIMIT, RASTER_REFLECTION_THRESHOLD)
 
 def plot_crystal_structure(hkl_data, initial_size=50):
     # Create figure and 3D axes with extra space for controls
     fig = plt.figure(figsize=(16, 14))
     ax = fig.add_subplot(111, projection='3d')
     
-    # Extract coordinates and sizes
-    h = np.array([x[0] for x in hkl_data])
-    k = np.array([x[1] for x in hkl_data])
-    l = np.array([x[2] for x in hkl_data])
-    sizes = np.array([x[3] for x in hkl_data])
+    # Extract coordinates and sizes sorted by increasing |Fc|², so that the
+    # reflections passing an intensity threshold form a run at the end
+    order = np.argsort(hkl_data['fc2'], kind='stable')
+    h = hkl_data['h'][order]
+    k = hkl_data['k'][order]
+    l = hkl_data['l'][order]
+    sizes = hkl_data['fc2'][order]
     
     # Store max_size for normalization
     max_size = np.max(sizes)
     
-    # Calculate initial sizes
-    initial_sizes = initial_size * (sizes / max_size)
+    # Normalize once, size updates only scale this by the size factor
+    norm_sizes = sizes / max_size
     
-    # Create scatter plot
+    # Calculate initial sizes
+    initial_sizes = initial_size * norm_sizes
+    
+    # Map intensities to colors once, the color scale spans the whole dataset.
+    # Each reflection stores a uint8 index into the colormap's lookup table,
+    # which selects the same color the colormap would for the normalized value
+    color_norm = Normalize(vmin=np.min(sizes), vmax=max_size)
+    colormap = plt.get_cmap('viridis')
+    color_lut = colormap(np.arange(colormap.N)).astype(np.float32)
+    color_index = np.minimum(color_norm(sizes) * colormap.N, colormap.N - 1).astype(np.uint8)
+    
+    # Create scatter plot, large sets skip stroking marker edges and are
+    # rasterized when saved to vector formats
+    large = len(hkl_data) > RASTER_REFLECTION_THRESHOLD
     scatter = ax.scatter(h, k, l, 
                         s=initial_sizes,
                         alpha=0.6,
-                        c=sizes,
-                        cmap='viridis')
+                        c=color_lut[color_index],
+                        linewidths=0 if large else None,
+                        rasterized=large)
     
     # Add colorbar
-    colorbar = plt.colorbar(scatter, label='|Fc|²')
+    plt.colorbar(ScalarMappable(norm=color_norm, cmap=colormap), ax=ax, alpha=0.6, label='|Fc|²')
     
     # Set labels and title
     ax.set_xlabel('H')
@@ -70,10 +72,15 @@ def plot_crystal_structure(hkl_data, initial_size=50):
     
     # HKL Range Control Section
     # Extract H, K, L ranges
-    h_min, h_max = min(h), max(h)
-    k_min, k_max = min(k), max(k)
-    l_min, l_max = min(l), max(l)
-    intensity_min, intensity_max = min(sizes), max(sizes)
+    h_min, h_max = h.min(), h.max()
+    k_min, k_max = k.min(), k.max()
+    l_min, l_max = l.min(), l.max()
+    intensity_min, intensity_max = sizes.min(), sizes.max()
+    
+    # Add HKL info text on plot, it is created once and stays in place while the data is filtered
+    ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
+              transform=ax.transAxes, fontsize=10, verticalalignment='top',
+              bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
     
     # Create sliders for H, K, L ranges
     slider_height = 0.02
@@ -139,20 +146,93 @@ def plot_crystal_structure(hkl_data, initial_size=50):
     status_ax = plt.axes([0.65, 0.12, 0.3, 0.08])
     status_textbox = TextBox(status_ax, 'Status:', initial=f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
     
-    # Store original data for filtering
-    original_h = h.copy()
-    original_k = k.copy()
-    original_l = l.copy()
-    original_sizes = sizes.copy()
-    original_indices = np.arange(len(hkl_data))
+    # Store original data for filtering, the sorted columns are already copies
+    original_h = h
+    original_k = k
+    original_l = l
+    original_sizes = sizes
+    
+    # Filter mask buffer, reused by every update
+    mask_buffer = np.empty(len(hkl_data), dtype=bool)
+    
+    # Reflections currently shown and their marker sizes
+    shown_selection = slice(None)
+    shown_sizes = initial_sizes
+    rotating = False
+    
+    def set_scatter_data(selection, new_sizes):
+        """Show the reflections picked by an index array or slice, thinned out to a subsample while the view is rotated"""
+        nonlocal shown_selection, shown_sizes
+        shown_selection, shown_sizes = selection, new_sizes
+        h_shown, k_shown, l_shown = original_h[selection], original_k[selection], original_l[selection]
+        colors_shown = color_index[selection]
+        if rotating:
+            step = len(colors_shown) // ROTATION_POINT_LIMIT + 1
+            h_shown, k_shown, l_shown = h_shown[::step], k_shown[::step], l_shown[::step]
+            colors_shown, new_sizes = colors_shown[::step], new_sizes[::step]
+        scatter._offsets3d = (h_shown, k_shown, l_shown)
+        scatter.set_sizes(new_sizes)
+        scatter.set_facecolor(color_lut[colors_shown])
+    
+    def on_press(event):
+        """Draw a subsample while the mouse rotates or zooms the 3D view"""
+        nonlocal rotating
+        if event.inaxes is not ax or len(shown_sizes) <= ROTATION_POINT_LIMIT:
+            return
+        rotating = True
+        set_scatter_data(shown_selection, shown_sizes)
+    
+    def on_release(event):
+        """Restore the full set of reflections once the mouse is released"""
+        nonlocal rotating
+        if not rotating:
+            return
+        rotating = False
+        set_scatter_data(shown_selection, shown_sizes)
+        fig.canvas.draw_idle()
     
-    # Store colorbar reference to avoid overplotting
-    current_colorbar = colorbar
+    fig.canvas.mpl_connect('button_press_event', on_press)
+    fig.canvas.mpl_connect('button_release_event', on_release)
+    
+    # Blitting: the scatter, title and status text are animated, so full draws cache a
+    # background without them and filter updates only redraw these artists on top.
+    # Canvases that cannot blit keep the artists in the regular draw and use draw_idle
+    animated_artists = [scatter, ax.title, status_textbox.text_disp]
+    if fig.canvas.supports_blit:
+        for artist in animated_artists:
+            artist.set_animated(True)
+    background = None
+    
+    def draw_animated():
+        """Draw the animated artists with the current 3D projection"""
+        scatter.do_3d_projection()
+        for artist in animated_artists:
+            fig.draw_artist(artist)
+    
+    def on_draw(event):
+        """Cache the static background after every full draw, e.g. on resize or rotation"""
+        nonlocal background
+        if fig.canvas.is_saving():
+            # Animated artists are part of the regular draw when saving
+            return
+        background = fig.canvas.copy_from_bbox(fig.bbox)
+        draw_animated()
+    
+    if fig.canvas.supports_blit:
+        fig.canvas.mpl_connect('draw_event', on_draw)
+    
+    def redraw():
+        """Show changes to the animated artists, blitting once a background is cached"""
+        if background is None:
+            fig.canvas.draw_idle()
+        else:
+            # Only the animated artists changed, redraw them over the cached background
+            fig.canvas.restore_region(background)
+            draw_animated()
+            fig.canvas.blit(fig.bbox)
     
     def update_display():
         """Update display based on current filter settings"""
-        nonlocal current_colorbar
-        
         # Get current range values
         h_min_val = h_min_slider.val
         h_max_val = h_max_slider.val
@@ -163,84 +243,70 @@ def plot_crystal_structure(hkl_data, initial_size=50):
         intensity_threshold = intensity_slider.val
         size_factor = size_slider.val
         
+        # The reflections are sorted by intensity, so the intensity threshold keeps
+        # everything from start on and the ranges are only tested on that part.
+        # The threshold is compared in the precision of the intensities
+        start = np.searchsorted(original_sizes, original_sizes.dtype.type(intensity_threshold))
+        
         # Filter data based on ranges
-        mask = ((original_h >= h_min_val) & (original_h <= h_max_val) &
-                (original_k >= k_min_val) & (original_k <= k_max_val) &
-                (original_l >= l_min_val) & (original_l <= l_max_val) &
-                (original_sizes >= intensity_threshold))
+        mask = mask_buffer[start:]
+        hkl_range_mask(original_h[start:], original_k[start:], original_l[start:],
+                       (h_min_val, h_max_val), (k_min_val, k_max_val), (l_min_val, l_max_val), out=mask)
         
-        filtered_indices = original_indices[mask]
+        filtered_indices = start + np.flatnonzero(mask)
+        count = len(filtered_indices)
         
-        # Remove existing colorbar to avoid overplotting
-        if current_colorbar is not None:
-            current_colorbar.remove()
+        # Calculate new sizes
+        new_sizes = size_factor * norm_sizes[filtered_indices]
+        set_scatter_data(filtered_indices, new_sizes)
         
-        if len(filtered_indices) > 0:
-            # Update scatter plot with filtered data
-            h_filtered = original_h[filtered_indices]
-            k_filtered = original_k[filtered_indices]
-            l_filtered = original_l[filtered_indices]
-            sizes_filtered = original_sizes[filtered_indices]
-            
-            # Calculate new sizes
-            new_sizes = size_factor * (sizes_filtered / max_size)
-            
-            # Clear previous scatter plot and create new one
-            ax.clear()
+        if count > 0:
+            ax.title.set_text(f'Crystal Structure Visualization\nSphere size proportional to |Fc|² (size factor: {int(size_factor)})')
             
-            # Recreate the scatter plot
-            new_scatter = ax.scatter(h_filtered, k_filtered, l_filtered, 
-                                   s=new_sizes, c=sizes_filtered, cmap='viridis', 
-                                   alpha=0.6)
-            
-            # Create new colorbar
-            current_colorbar = plt.colorbar(new_scatter, label='|Fc|²')
-            
-            # Restore labels and title
-            ax.set_xlabel('H')
-            ax.set_ylabel('K')
-            ax.set_zlabel('L')
-            ax.set_title(f'Crystal Structure Visualization\nSphere size proportional to |Fc|² (size factor: {int(size_factor)})')
-            
-            # Restore grid and aspect ratio
-            ax.grid(True)
-            ax.set_box_aspect([1,1,1])
-            
-            # Restore HKL info text
-            ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                      transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-            
-            # Update status
-            status_textbox.set_val(f'Showing {len(filtered_indices)} reflections\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
+            # Update status, setting the text directly since TextBox.set_val forces a full draw
+            status_textbox.text_disp.set_text(f'Showing {count} reflections\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
         else:
-            # Clear scatter plot if no data matches
-            ax.clear()
-            current_colorbar = None
-            
-            # Restore labels and title
-            ax.set_xlabel('H')
-            ax.set_ylabel('K')
-            ax.set_zlabel('L')
-            ax.set_title(f'Crystal Structure Visualization\nNo reflections match criteria')
-            
-            # Restore grid and aspect ratio
-            ax.grid(True)
-            ax.set_box_aspect([1,1,1])
-            
-            # Restore HKL info text
-            ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                      transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-            
-            status_textbox.set_val(f'No reflections match criteria\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
+            ax.title.set_text(f'Crystal Structure Visualization\nNo reflections match criteria')
+            status_textbox.text_disp.set_text(f'No reflections match criteria\nH: {h_min_val}-{h_max_val}, K: {k_min_val}-{k_max_val}, L: {l_min_val}-{l_max_val}\nIntensity ≥ {intensity_threshold:.2e}')
         
+        redraw()
+    
+    # Coalesce rapid slider changes into a single update once the user pauses
+    update_timer = fig.canvas.new_timer(interval=30)
+    update_timer.single_shot = True
+    update_timer.add_callback(update_display)
+    
+    suspend_updates = False
+    
+    def schedule_update(val):
+        """Restart the update timer so that a slider drag triggers one update"""
+        if suspend_updates:
+            return
+        update_timer.stop()
+        update_timer.start()
+    
+    def set_sliders(slider_values):
+        """Set several sliders without triggering an update or redraw for each of them"""
+        nonlocal suspend_updates
+        suspend_updates = True
+        try:
+            for slider, value in slider_values:
+                slider.drawon = False
+                slider.set_val(value)
+                slider.drawon = True
+        finally:
+            suspend_updates = False
         fig.canvas.draw_idle()
     
+    def show_all():
+        """Show all reflections at the initial size"""
+        set_scatter_data(slice(None), initial_sizes)
+        ax.title.set_text(f'Crystal Structure Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})')
+        status_textbox.text_disp.set_text(f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
+        redraw()
+    
     def toggle_visibility(event):
         """Toggle between showing all data and filtered data"""
-        nonlocal current_colorbar
-        
         if toggle_button.label.get_text() == 'Show All':
             # Show filtered data
             toggle_button.label.set_text('Show Filtered')
@@ -248,49 +314,21 @@ def plot_crystal_structure(hkl_data, initial_size=50):
         else:
             # Show all data
             toggle_button.label.set_text('Show All')
-            
-            # Remove existing colorbar to avoid overplotting
-            if current_colorbar is not None:
-                current_colorbar.remove()
-            
-            # Clear and recreate with all data
-            ax.clear()
-            
-            # Recreate scatter plot with all data
-            all_scatter = ax.scatter(original_h, original_k, original_l, 
-                                   s=initial_sizes, c=original_sizes, cmap='viridis', 
-                                   alpha=0.6)
-            
-            # Create new colorbar
-            current_colorbar = plt.colorbar(all_scatter, label='|Fc|²')
-            
-            # Restore labels and title
-            ax.set_xlabel('H')
-            ax.set_ylabel('K')
-            ax.set_zlabel('L')
-            ax.set_title(f'Crystal Structure Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})')
-            
-            # Restore grid and aspect ratio
-            ax.grid(True)
-            ax.set_box_aspect([1,1,1])
-            
-            # Restore HKL info text
-            ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                      transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                      bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-            
-            status_textbox.set_val(f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
-            fig.canvas.draw_idle()
+            show_all()
+        
+        # The button label is not animated, so it needs a full draw
+        fig.canvas.draw_idle()
+    
+    # Sliders and the values that remove all filtering
+    full_ranges = [(h_min_slider, h_min), (h_max_slider, h_max),
+                   (k_min_slider, k_min), (k_max_slider, k_max),
+                   (l_min_slider, l_min), (l_max_slider, l_max),
+                   (intensity_slider, intensity_min)]
     
     def reset_ranges(event):
         """Reset all range sliders to full range"""
-        h_min_slider.set_val(h_min)
-        h_max_slider.set_val(h_max)
-        k_min_slider.set_val(k_min)
-        k_max_slider.set_val(k_max)
-        l_min_slider.set_val(l_min)
-        l_max_slider.set_val(l_max)
-        intensity_slider.set_val(intensity_min)
+        set_sliders(full_ranges)
+        update_display()
     
     def reset_size(event):
         """Reset size slider to initial value"""
@@ -298,44 +336,12 @@ def plot_crystal_structure(hkl_data, initial_size=50):
     
     def clear_filter(event):
         """Clear all filters and show all data"""
-        nonlocal current_colorbar
-        
-        reset_ranges(event)
-        reset_size(event)
+        set_sliders(full_ranges + [(size_slider, initial_size)])
         toggle_button.label.set_text('Show All')
         
-        # Remove existing colorbar to avoid overplotting
-        if current_colorbar is not None:
-            current_colorbar.remove()
-        
-        # Clear and recreate with all data
-        ax.clear()
-        
-        # Recreate scatter plot with all data
-        all_scatter = ax.scatter(original_h, original_k, original_l, 
-                               s=initial_sizes, c=original_sizes, cmap='viridis', 
-                               alpha=0.6)
-        
-        # Create new colorbar
-        current_colorbar = plt.colorbar(all_scatter, label='|Fc|²')
-        
-        # Restore labels and title
-        ax.set_xlabel('H')
-        ax.set_ylabel('K')
-        ax.set_zlabel('L')
-        ax.set_title(f'Crystal Structure Visualization\nSphere size proportional to |Fc|² (size factor: {initial_size})')
-        
-        # Restore grid and aspect ratio
-        ax.grid(True)
-        ax.set_box_aspect([1,1,1])
-        
-        # Restore HKL info text
-        ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-                  transform=ax.transAxes, fontsize=10, verticalalignment='top',
-                  bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-        
-        status_textbox.set_val(f'Showing all {len(hkl_data)} reflections\nH: {h_min}-{h_max}, K: {k_min}-{k_max}, L: {l_min}-{l_max}')
-        fig.canvas.draw_idle()
+        # Drop any update still pending from a slider drag
+        update_timer.stop()
+        show_all()
     
     def set_preset_size(factor):
         def handler(event):
@@ -343,14 +349,9 @@ def plot_crystal_structure(hkl_data, initial_size=50):
         return handler
     
     # Connect sliders and buttons
-    h_min_slider.on_changed(lambda val: update_display())
-    h_max_slider.on_changed(lambda val: update_display())
-    k_min_slider.on_changed(lambda val: update_display())
-    k_max_slider.on_changed(lambda val: update_display())
-    l_min_slider.on_changed(lambda val: update_display())
-    l_max_slider.on_changed(lambda val: update_display())
-    intensity_slider.on_changed(lambda val: update_display())
-    size_slider.on_changed(lambda val: update_display())
+    for slider in (h_min_slider, h_max_slider, k_min_slider, k_max_slider,
+                   l_min_slider, l_max_slider, intensity_slider, size_slider):
+        slider.on_changed(schedule_update)
     
     toggle_button.on_clicked(toggle_visibility)
     reset_ranges_button.on_clicked(reset_ranges)
@@ -361,11 +362,6 @@ def plot_crystal_structure(hkl_data, initial_size=50):
     preset2.on_clicked(set_preset_size(3))
     preset3.on_clicked(set_preset_size(5))
     
-    # Add HKL info text on plot
-    ax.text2D(0.02, 0.98, f'HKL Data: {len(hkl_data)} reflections\nH: {h_min} to {h_max}\nK: {k_min} to {k_max}\nL: {l_min} to {l_max}', 
-              transform=ax.transAxes, fontsize=10, verticalalignment='top',
-              bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-    
     # Show the plot
     plt.show()
 
@@ -380,7 +376,7 @@ def main():
     
     try:
         hkl_data = read_hkl_file(args.filename)
-        if not hkl_data:
+        if len(hkl_data) == 0:
             print("No data found in the file or incorrect format.")
             sys.exit(1)
         plot_crystal_structure(hkl_data, args.size)